@@ -2,15 +2,30 @@
 # app.py - FINAL VERSION - Landing page only for users
 import streamlit as st
 import hashlib
+from datetime import datetime
 from sqlalchemy import text
-from lib.db import init_db, get_engine
-from lib.auth import ensure_session_keys
+from lib.db import init_db, get_engine, verify_password
+from lib.auth import ensure_session_keys, get_cookie_manager, persist_auth_cookie, revoke_auth_cookie
 from lib.ui import topbar_brand
 
+# Resolve the optional lib.auth helpers once at import instead of on every login attempt
+try:
+    from lib.auth import authenticate_user as _auth_user, register_user as _reg_user
+    _HAS_LIB_AUTH = True
+except ImportError:
+    _HAS_LIB_AUTH = False
+
 # --- Role-Based Page Definitions ---
 
 # app.py - Control what users SEE in navigation
 def get_pages_for_role(role):
+    """Return pages based on user role, built once per session and role"""
+    pages_by_role = st.session_state.setdefault("_pages_by_role", {})
+    if role not in pages_by_role:
+        pages_by_role[role] = _build_pages_for_role(role)
+    return pages_by_role[role]
+
+def _build_pages_for_role(role):
     """Return pages based on user role - Navigation controls what users see"""
     if role == "user":
         # User: User dashboard + landing page
@@ -38,13 +53,9 @@ def get_pages_for_role(role):
 
 def authenticate_via_lib_auth(email, password):
     """Updated authentication to handle your existing hash format"""
-    try:
-        from lib.auth import authenticate_user
-        return authenticate_user(email, password)
-    except ImportError:
-        from sqlalchemy import text
-        import hashlib
-        
+    if _HAS_LIB_AUTH:
+        return _auth_user(email, password)
+    else:
         eng = get_engine()
         with eng.connect() as conn:
             user = conn.execute(text("""
@@ -53,45 +64,37 @@ def authenticate_via_lib_auth(email, password):
             """), {'email': email}).fetchone()
             
             if user and user.password_hash:
-                # Handle bcrypt format (if available)
-                try:
-                    import bcrypt
-                    if bcrypt.checkpw(password.encode('utf-8'), user.password_hash.encode('utf-8')):
-                        return {"success": True, "user": user}
-                except:
-                    pass
+                stored = user.password_hash
+                pw_bytes = password.encode()
+                
+                # Handle plain SHA-256 first - cheapest and most common format
+                if stored == hashlib.sha256(pw_bytes).hexdigest():
+                    return {"success": True, "user": user}
                 
-                # Handle hash:salt format (your current format)
-                if ':' in user.password_hash:
+                # Handle bcrypt format (if available) - intentionally slow, so only for bcrypt hashes
+                if stored.startswith(("$2b$", "$2a$", "$2y$")):
                     try:
-                        stored_hash, salt = user.password_hash.split(':')
-                        computed_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-                        if computed_hash == stored_hash:
+                        import bcrypt
+                        if bcrypt.checkpw(pw_bytes, stored.encode('utf-8')):
                             return {"success": True, "user": user}
-                    except:
+                    except (ImportError, ValueError, TypeError):
                         pass
                 
-                # Handle plain SHA-256
-                sha256_hash = hashlib.sha256(password.encode()).hexdigest()
-                if user.password_hash == sha256_hash:
+                # Handle argon2 and salted SHA-256 formats written by lib.db.hash_password
+                elif verify_password(password, stored):
                     return {"success": True, "user": user}
                 
                 # Handle plain text fallback
-                if user.password_hash == password:
+                if stored == password:
                     return {"success": True, "user": user}
             
             return {"success": False}
 
 def register_via_lib_auth(name, email, phone, password, role="user"):
     """Enhanced registration system with role selection and approval workflow"""
-    try:
-        from lib.auth import register_user
-        return register_user(name, email, phone, password, role)
-    except ImportError:
-        import hashlib
-        from sqlalchemy import text
-        from datetime import datetime
-        
+    if _HAS_LIB_AUTH:
+        return _reg_user(name, email, phone, password, role)
+    else:
         eng = get_engine()
         with eng.connect() as conn:
             # Check if email already exists
@@ -134,8 +137,13 @@ def register_via_lib_auth(name, email, phone, password, role="user"):
             }
 
 
-# Initialize everything
-init_db()
+# Initialize everything - schema setup runs once per process, not on every rerun
+@st.cache_resource
+def _init_db_once():
+    init_db()
+    return True
+
+_init_db_once()
 ensure_session_keys()
 
 def main():
@@ -147,6 +155,9 @@ def main():
         initial_sidebar_state="expanded"
     )
     
+    # Keeps the login in a signed cookie across browser refreshes (when installed)
+    cookie_manager = get_cookie_manager()
+    
     # If user is not authenticated, show login/register
     if not st.session_state.get("auth_status"):
         
@@ -185,6 +196,8 @@ def main():
                                 st.session_state.user_id = user.id
                                 st.session_state.email = user.email
                                 st.session_state.role = user.role
+                                st.session_state.name = user.name or user.email.split("@")[0]
+                                persist_auth_cookie(cookie_manager)
                                 st.success("✅ Login successful!")
                                 st.rerun()
                             else:
@@ -277,9 +290,10 @@ def main():
             
             # Logout button
             if st.sidebar.button("🚪 Logout", use_container_width=True):
+                # Drop the cookie first, or the next run would restore the login from it
+                revoke_auth_cookie(cookie_manager)
                 # Clear all session state
-                for key in list(st.session_state.keys()):
-                    del st.session_state[key]
+                st.session_state.clear()
                 st.rerun()
             
             # Show top bar
@@ -290,8 +304,8 @@ def main():
         else:
             st.error("❌ No pages available for your role.")
             if st.button("🚪 Logout"):
-                for key in list(st.session_state.keys()):
-                    del st.session_state[key]
+                revoke_auth_cookie(cookie_manager)
+                st.session_state.clear()
                 st.rerun()
 
 if __name__ == "__main__":
@@ -1,40 +1,67 @@
 # clear_users.py - Delete all users from database
 from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+PREVIEW_LIMIT = 20
+
+# Statements built once at import and reused
+COUNT_USERS = text("SELECT COUNT(*) FROM users")
+PREVIEW_USERS = text("SELECT id, email, role FROM users LIMIT :limit")
+DELETE_USERS = text("DELETE FROM users")
+
+# Dev-utility tuning: WAL + relaxed fsync, in-memory temp tables, 64MB page cache
+BULK_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
 
 def delete_all_users():
     """Delete ALL users from database"""
     try:
-        # Connect to your database
-        engine = create_engine('sqlite:///fraud_app.db')
+        # Connect to your database - single-connection script, so StaticPool reuses one connection
+        engine = create_engine(
+            'sqlite:///fraud_app.db',
+            poolclass=StaticPool,
+            connect_args={'check_same_thread': False}
+        )
         
         with engine.connect() as conn:
+            # StaticPool keeps this connection, so the PRAGMAs also apply to the DELETE below
+            for pragma in BULK_PRAGMAS:
+                conn.exec_driver_sql(pragma)
+            
             # Count users before deletion
-            count_before = conn.execute(text("SELECT COUNT(*) FROM users")).scalar()
+            count_before = conn.execute(COUNT_USERS).scalar()
             print(f"📊 Found {count_before} users in database")
             
             if count_before == 0:
                 print("✅ Database is already empty")
                 return
             
-            # Show all users that will be deleted
-            users = conn.execute(text("SELECT id, email, role FROM users")).fetchall()
-            print("👥 Users to be deleted:")
-            for user in users:
-                print(f"  - ID: {user.id}, Email: {user.email}, Role: {user.role}")
+            # Preview a bounded sample instead of loading the whole table
+            users = conn.execute(PREVIEW_USERS, {"limit": PREVIEW_LIMIT}).fetchall()
+        
+        print("👥 Users to be deleted:")
+        for user in users:
+            print(f"  - ID: {user.id}, Email: {user.email}, Role: {user.role}")
+        if count_before > len(users):
+            print(f"  ... and {count_before - len(users)} more")
+        
+        # Confirm deletion
+        confirm = input(f"\n⚠️  Are you sure you want to delete ALL {count_before} users? (yes/no): ")
+        
+        if confirm.lower() in ['yes', 'y']:
+            # Delete all users atomically - commits on success, rolls back on error
+            with engine.begin() as conn:
+                result = conn.execute(DELETE_USERS)
             
-            # Confirm deletion
-            confirm = input(f"\n⚠️  Are you sure you want to delete ALL {count_before} users? (yes/no): ")
+            print(f"✅ Successfully deleted {result.rowcount} users!")
+            print("🗂️ Users table is now empty")
+        else:
+            print("❌ Operation cancelled")
             
-            if confirm.lower() in ['yes', 'y']:
-                # Delete all users
-                result = conn.execute(text("DELETE FROM users"))
-                conn.commit()
-                
-                print(f"✅ Successfully deleted {result.rowcount} users!")
-                print("🗂️ Users table is now empty")
-            else:
-                print("❌ Operation cancelled")
-                
     except Exception as e:
         print(f"❌ Error: {e}")
 
@@ -1,9 +1,15 @@
 import hashlib
-import bcrypt
 from datetime import datetime
 from sqlalchemy import text
 from lib.db import get_engine
 
+# Statements built once at import and reused for every executemany
+DELETE_USER = text("DELETE FROM users WHERE email = :email")
+INSERT_USER = text("""
+    INSERT INTO users (name, email, password_hash, role, status, balance, created_at, phone)
+    VALUES (:name, :email, :password_hash, :role, :status, :balance, :created_at, :phone)
+""")
+
 def create_fresh_demo_accounts():
     """Create completely new demo accounts that will work"""
     eng = get_engine()
@@ -33,64 +39,61 @@ def create_fresh_demo_accounts():
         }
     ]
     
-    with eng.connect() as conn:
-        print("🧹 Creating fresh demo accounts...")
-        
+    print("🧹 Creating fresh demo accounts...")
+    
+    # Use simple SHA256 (most common format), same method as your working user
+    created_at = datetime.now()
+    delete_params = [{'email': account['email']} for account in new_accounts]
+    insert_params = [
+        {
+            'name': account['name'],
+            'email': account['email'],
+            'password_hash': hashlib.sha256(account['password'].encode()).hexdigest(),
+            'role': account['role'],
+            'status': 'active',
+            'balance': account['balance'],
+            'created_at': created_at,
+            'phone': '9999999999'
+        }
+        for account in new_accounts
+    ]
+    
+    # Single transaction: one executemany DELETE, one executemany INSERT.
+    # get_engine() already applies the SQLite tuning PRAGMAs on connect.
+    with eng.begin() as conn:
         # Delete any existing demo accounts first
-        for account in new_accounts:
-            conn.execute(text("DELETE FROM users WHERE email = :email"), 
-                        {'email': account['email']})
-        
-        # Create accounts using the SAME method as your working user
-        for account in new_accounts:
-            # Use simple SHA256 (most common format)
-            password_hash = hashlib.sha256(account['password'].encode()).hexdigest()
-            
-            # Insert new account
-            conn.execute(text("""
-                INSERT INTO users (name, email, password_hash, role, status, balance, created_at, phone)
-                VALUES (:name, :email, :password_hash, :role, :status, :balance, :created_at, :phone)
-            """), {
-                'name': account['name'],
-                'email': account['email'], 
-                'password_hash': password_hash,
-                'role': account['role'],
-                'status': 'active',
-                'balance': account['balance'],
-                'created_at': datetime.now(),
-                'phone': '9999999999'
-            })
-            
-            print(f"✅ Created {account['role'].upper()}: {account['email']}")
-            print(f"   Password: {account['password']}")
-            print(f"   Hash: SHA256")
-        
-        conn.commit()
-        
-        print("\n🎯 NEW DEMO CREDENTIALS:")
-        print("=" * 50)
-        for account in new_accounts:
-            print(f"🔑 {account['role'].upper()} LOGIN:")
-            print(f"   Email: {account['email']}")
-            print(f"   Password: {account['password']}")
-            print("-" * 30)
-        
-        # Test authentication for each account
-        print("\n🧪 TESTING AUTHENTICATION:")
-        from app import authenticate_via_lib_auth
-        
-        for account in new_accounts:
-            try:
-                result = authenticate_via_lib_auth(account['email'], account['password'])
-                if result and result.get('success'):
-                    user = result['user'] 
-                    print(f"✅ {account['email']} - LOGIN SUCCESS")
-                    print(f"   Role: {user.role}")
-                    print(f"   Status: {user.status}")
-                else:
-                    print(f"❌ {account['email']} - LOGIN FAILED")
-            except Exception as e:
-                print(f"💥 {account['email']} - ERROR: {str(e)}")
+        conn.execute(DELETE_USER, delete_params)
+        conn.execute(INSERT_USER, insert_params)
+    
+    for account in new_accounts:
+        print(f"✅ Created {account['role'].upper()}: {account['email']}")
+        print(f"   Password: {account['password']}")
+        print(f"   Hash: SHA256")
+    
+    print("\n🎯 NEW DEMO CREDENTIALS:")
+    print("=" * 50)
+    for account in new_accounts:
+        print(f"🔑 {account['role'].upper()} LOGIN:")
+        print(f"   Email: {account['email']}")
+        print(f"   Password: {account['password']}")
+        print("-" * 30)
+    
+    # Test authentication for each account
+    print("\n🧪 TESTING AUTHENTICATION:")
+    from app import authenticate_via_lib_auth
+    
+    for account in new_accounts:
+        try:
+            result = authenticate_via_lib_auth(account['email'], account['password'])
+            if result and result.get('success'):
+                user = result['user'] 
+                print(f"✅ {account['email']} - LOGIN SUCCESS")
+                print(f"   Role: {user.role}")
+                print(f"   Status: {user.status}")
+            else:
+                print(f"❌ {account['email']} - LOGIN FAILED")
+        except Exception as e:
+            print(f"💥 {account['email']} - ERROR: {str(e)}")
 
 if __name__ == "__main__":
     create_fresh_demo_accounts()
@@ -1,128 +1,268 @@
 # lib/auth.py - Complete working version with phone validation and database lock fixes
 import streamlit as st
 from sqlalchemy import select, insert, update
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from email_validator import validate_email, EmailNotValidError
 import re
+import os
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+import functools
 import time
-import random
-from lib.db import get_engine, users, audit_logs, hash_password, verify_password
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+from datetime import datetime, timedelta
+from lib.db import get_engine, get_user_by_email, dialect_insert, users, audit_logs, hash_password, verify_password
+from lib.validators import validate_phone, format_phone
+
+# Optional cookie persistence - login survives browser refresh when installed
+try:
+    import extra_streamlit_components as stx
+except ImportError:
+    stx = None
+
+# Validation patterns compiled once at import
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Signed auth cookie - HMAC-SHA256 over the claims, verified locally without a DB call.
+# Without APP_AUTH_SECRET a per-process key is used, so cookies expire on restart.
+_AUTH_COOKIE = "auth"
+_AUTH_TOKEN_TTL = timedelta(days=7)
+_AUTH_SECRET = os.getenv("APP_AUTH_SECRET", "").encode() or secrets.token_bytes(32)
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign_auth_token(claims):
+    """Encode claims as payload.signature"""
+    payload = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    sig = _b64(hmac.new(_AUTH_SECRET, payload.encode(), hashlib.sha256).digest())
+    return f"{payload}.{sig}"
+
+def _verify_auth_token(token):
+    """Return the claims of a valid, unexpired token, else None"""
+    try:
+        payload, sig = token.split(".")
+        expected = _b64(hmac.new(_AUTH_SECRET, payload.encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(sig, expected):
+            return None
+        claims = json.loads(_unb64(payload))
+        if claims.get("exp", 0) < time.time():
+            return None
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return claims
+
+def _read_auth_cookie():
+    """Read the auth cookie from the request headers (streamlit>=1.37), if available"""
+    context = getattr(st, "context", None)
+    cookies = getattr(context, "cookies", None)
+    return cookies.get(_AUTH_COOKIE) if cookies else None
+
+# Tokens logged out in this process -> their expiry. Deleting the cookie happens in the
+# browser and can be lost, and st.context.cookies keeps the value the session started with,
+# so a logged-out token is refused here until it would have expired anyway.
+_revoked_tokens = {}
+_revoked_lock = threading.Lock()
+
+def get_cookie_manager():
+    """The auth CookieManager for this run, or None without extra_streamlit_components.
+
+    Call once per script run - it renders a component and is not cached across sessions.
+    """
+    return stx.CookieManager(key="auth_cookie_manager") if stx else None
+
+def persist_auth_cookie(cookie_manager):
+    """Store the current session's login in a signed cookie"""
+    if cookie_manager is None:
+        return
+    expires = datetime.now() + _AUTH_TOKEN_TTL
+    token = _sign_auth_token({
+        "uid": st.session_state["user_id"],
+        "role": st.session_state["role"],
+        "email": st.session_state["email"],
+        "name": st.session_state["name"],
+        "exp": int(expires.timestamp()),
+    })
+    st.session_state["_auth_token"] = token
+    cookie_manager.set(_AUTH_COOKIE, token, expires_at=expires, key="auth_cookie_set")
+
+def revoke_auth_cookie(cookie_manager=None):
+    """Delete the auth cookie and refuse its token, so logging out sticks"""
+    now = time.time()
+    with _revoked_lock:
+        for token in (st.session_state.get("_auth_token"), _read_auth_cookie()):
+            claims = _verify_auth_token(token) if token else None
+            if claims:
+                _revoked_tokens[token] = claims["exp"]
+        for token, exp in list(_revoked_tokens.items()):
+            if exp < now:
+                del _revoked_tokens[token]
+    
+    if cookie_manager is not None and cookie_manager.get(_AUTH_COOKIE):
+        cookie_manager.delete(_AUTH_COOKIE, key="auth_cookie_delete")
+    st.session_state.pop("_auth_token", None)
 
 def ensure_session_keys():
     """Initialize session state keys if they don't exist"""
-    for k, v in {
-        "auth_status": False,
-        "user_id": None,
-        "role": None,
-        "email": None,
-        "name": None,
-    }.items():
-        if k not in st.session_state:
-            st.session_state[k] = v
-
-def validate_phone(phone):
-    """Validate 10-digit phone number"""
-    if not phone:
-        return False
-    
-    # Remove any spaces, hyphens, parentheses, dots
-    clean_phone = re.sub(r'[^\d]', '', phone)
+    st.session_state.setdefault("auth_status", False)
+    st.session_state.setdefault("user_id", None)
+    st.session_state.setdefault("role", None)
+    st.session_state.setdefault("email", None)
+    st.session_state.setdefault("name", None)
     
-    # Check if it's exactly 10 digits
-    if len(clean_phone) == 10 and clean_phone.isdigit():
-        return True
-    
-    return False
+    # Restore a login from the signed cookie after a browser refresh
+    if not st.session_state["auth_status"]:
+        token = _read_auth_cookie()
+        with _revoked_lock:
+            revoked = token in _revoked_tokens
+        claims = _verify_auth_token(token) if token and not revoked else None
+        # Re-check the account so a pending, rejected or suspended user can't ride the
+        # cookie; demo/seed accounts are 'active', admin-approved ones 'approved'.
+        # get_user_by_email is served from memory, so this rarely touches the DB
+        u = get_user_by_email(claims["email"]) if claims else None
+        if u and u.id == claims["uid"] and u.status in ("approved", "active"):
+            st.session_state["auth_status"] = True
+            st.session_state["user_id"] = u.id
+            st.session_state["role"] = u.role
+            st.session_state["email"] = u.email
+            st.session_state["name"] = u.name or u.email.split("@")[0]
 
-def format_phone(phone):
-    """Format phone number as XXX-XXX-XXXX"""
-    if not phone:
-        return phone
-    
-    # Remove any non-digits
-    clean_phone = re.sub(r'[^\d]', '', phone)
-    
-    # Format as XXX-XXX-XXXX if 10 digits
-    if len(clean_phone) == 10:
-        return f"{clean_phone[:3]}-{clean_phone[3:6]}-{clean_phone[6:]}"
-    
-    return phone
+# Audit events are queued and written in batches by a background thread,
+# so login/register/logout never wait on an audit commit
+_AUDIT_BATCH_SIZE = 200
+_AUDIT_FLUSH_INTERVAL = 0.1  # seconds to wait for more events before flushing
+_AUDIT_STOP = object()
+_audit_q = queue.Queue()
+_AUDIT_INSERT = audit_logs.insert()
+
+# Audit failures are logged through a queue so the writer never blocks on stderr
+logger = logging.getLogger("audit")
+_log_q = queue.Queue(-1)
+logger.addHandler(logging.handlers.QueueHandler(_log_q))
+logger.propagate = False
+_log_listener = logging.handlers.QueueListener(_log_q, logging.StreamHandler())
+_log_listener.start()
+
+def _flush_audit(rows):
+    """Write a batch of audit rows in a single transaction"""
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(_AUDIT_INSERT, rows)
+    except SQLAlchemyError as e:
+        # Don't fail the main operation if audit fails
+        logger.warning("Audit log failed for %d events: %s", len(rows), e)
+
+def _audit_worker():
+    """Drain the audit queue, flushing every _AUDIT_BATCH_SIZE events or _AUDIT_FLUSH_INTERVAL"""
+    stopping = False
+    while not stopping:
+        item = _audit_q.get()
+        rows = []
+        deadline = time.monotonic() + _AUDIT_FLUSH_INTERVAL
+        while True:
+            if item is _AUDIT_STOP:
+                stopping = True
+                break
+            rows.append(item)
+            remaining = deadline - time.monotonic()
+            if len(rows) >= _AUDIT_BATCH_SIZE or remaining <= 0:
+                break
+            try:
+                item = _audit_q.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if rows:
+            _flush_audit(rows)
+
+def _shutdown_audit_worker():
+    """Flush pending audit events on interpreter exit"""
+    _audit_q.put(_AUDIT_STOP)
+    _audit_thread.join(timeout=5)
+    _log_listener.stop()
+
+_audit_thread = threading.Thread(target=_audit_worker, name="audit-log-writer", daemon=True)
+_audit_thread.start()
+atexit.register(_shutdown_audit_worker)
+
+@functools.lru_cache(maxsize=1024)
+def _email_error(email):
+    """Return why an email is invalid, or None - cheap regex prefilter before email_validator"""
+    if not _EMAIL_RE.match(email):
+        return "The email address is not valid."
+    try:
+        # Syntax only - no DNS deliverability lookup on the register path
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError as e:
+        return str(e)
+    return None
 
 def log_audit(actor_user_id, action, entity_type, entity_id, meta=None):
-    """Audit logging with retry mechanism to handle database locks"""
-    max_retries = 3
-    retry_delay = 0.1
-    
-    for attempt in range(max_retries):
-        try:
-            eng = get_engine()
-            with eng.begin() as conn:
-                conn.execute(audit_logs.insert().values(
-                    actor_user_id=actor_user_id,
-                    action=action,
-                    entity_type=entity_type,
-                    entity_id=entity_id or 0,
-                    meta=meta or {}
-                ))
-            return True
-        except Exception as e:
-            if attempt < max_retries - 1:
-                # Add small random delay to avoid collision
-                time.sleep(retry_delay + random.uniform(0, 0.1))
-                retry_delay *= 2
-            else:
-                # Don't fail the main operation if audit fails
-                print(f"Warning: Audit log failed after {max_retries} attempts: {e}")
-                return False
+    """Queue an audit event for the background writer (non-blocking)"""
+    _audit_q.put_nowait({
+        "actor_user_id": actor_user_id,
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id or 0,
+        # audit_logs has no meta column - store it as a JSON string in details
+        "details": json.dumps(meta) if meta else None,
+    })
+    return True
 
 def auth_login(email, password):
     """Handle user login with proper error handling"""
     try:
-        eng = get_engine()
-        with eng.begin() as conn:
-            u = conn.execute(select(users).where(users.c.email == email)).fetchone()
-            if not u:
-                return False, "Invalid email or password"
-            
-            if u.status == "pending":
-                return False, "Account pending admin approval"
-            elif u.status == "rejected":
-                return False, "Account has been rejected"
-            elif u.status != "approved":
-                return False, f"Account status: {u.status}"
-            
-            if not verify_password(password, u.password_hash):
-                return False, "Invalid email or password"
-            
-            # Set session state
-            st.session_state.update({
-                "auth_status": True,
-                "user_id": u.id,
-                "role": u.role,
-                "email": u.email,
-                "name": u.name or u.email.split("@")[0]
-            })
-            
-            # Log audit (non-blocking)
-            log_audit(u.id, "login", "user", u.id, {"role": u.role})
-            return True, f"Welcome back, {u.name or u.email}!"
+        u = get_user_by_email(email)
+        if not u:
+            return False, "Invalid email or password"
+        
+        if u.status == "pending":
+            return False, "Account pending admin approval"
+        elif u.status == "rejected":
+            return False, "Account has been rejected"
+        elif u.status != "approved":
+            return False, f"Account status: {u.status}"
+        
+        if not verify_password(password, u.password_hash):
+            return False, "Invalid email or password"
+        
+        # Set session state
+        st.session_state["auth_status"] = True
+        st.session_state["user_id"] = u.id
+        st.session_state["role"] = u.role
+        st.session_state["email"] = u.email
+        st.session_state["name"] = u.name or u.email.split("@")[0]
+        
+        # Log audit (non-blocking)
+        log_audit(u.id, "login", "user", u.id, {"role": u.role})
+        return True, f"Welcome back, {u.name or u.email}!"
             
     except Exception as e:
         return False, f"Login failed: {str(e)}"
 
-def auth_logout():
+def auth_logout(cookie_manager=None):
     """Handle user logout"""
     uid = st.session_state.get("user_id")
     if uid:
         log_audit(uid, "logout", "user", uid, {})
     
+    revoke_auth_cookie(cookie_manager)
+    
     # Clear session state
-    st.session_state.update({
-        "auth_status": False,
-        "user_id": None,
-        "role": None,
-        "email": None,
-        "name": None
-    })
+    st.session_state["auth_status"] = False
+    st.session_state["user_id"] = None
+    st.session_state["role"] = None
+    st.session_state["email"] = None
+    st.session_state["name"] = None
 
 def auth_register(name, email, phone, role, password):
     """Handle user registration with comprehensive validation"""
@@ -138,10 +278,9 @@ def auth_register(name, email, phone, role, password):
         return False, "Password must be at least 6 characters long"
     
     # Email validation
-    try:
-        validate_email(email.strip())
-    except EmailNotValidError as e:
-        return False, f"Invalid email: {str(e)}"
+    email_error = _email_error(email.strip().lower())
+    if email_error:
+        return False, f"Invalid email: {email_error}"
 
     # Phone validation
     if phone and not validate_phone(phone):
@@ -158,54 +297,47 @@ def auth_register(name, email, phone, role, password):
     except Exception as e:
         return False, f"Password processing failed: {str(e)}"
     
-    # Database operation with retry
-    max_retries = 3
-    for attempt in range(max_retries):
+    new_user = dict(
+        name=name,
+        email=email,
+        phone=formatted_phone,
+        role=role,
+        password_hash=phash,
+        status="pending",
+        balance=0.0,
+        kyc_status="not_submitted"
+    )
+    
+    # One retry if another writer holds the lock past busy_timeout
+    for attempt in range(2):
         try:
             eng = get_engine()
             with eng.begin() as conn:
-                # Check for existing user
-                existing = conn.execute(
-                    select(users.c.id).where(users.c.email == email)
-                ).fetchone()
-                
-                if existing:
-                    return False, "Email already registered. Please use a different email or try logging in."
-                
-                # Insert new user
-                result = conn.execute(users.insert().values(
-                    name=name,
-                    email=email,
-                    phone=formatted_phone,
-                    role=role,
-                    password_hash=phash,
-                    status="pending",
-                    balance=0.0,
-                    kyc_status="not_submitted"
-                ))
-                
-                uid = result.inserted_primary_key[0]
-            
-            # Log audit (non-blocking)
-            log_audit(uid, "register", "user", uid, {
-                "role": role,
-                "has_phone": bool(phone)
-            })
-            
-            return True, "Registration successful! Your account is pending admin approval. You will be notified once approved."
-            
-        except Exception as e:
-            error_str = str(e).lower()
-            if "database is locked" in error_str and attempt < max_retries - 1:
-                # Wait and retry for database locks
-                time.sleep(0.5 + random.uniform(0, 0.5))
+                # Single INSERT ... ON CONFLICT; the unique email index does the duplicate check
+                uid = conn.execute(
+                    dialect_insert(conn, users)
+                    .values(**new_user)
+                    .on_conflict_do_nothing(index_elements=[users.c.email])
+                    .returning(users.c.id)
+                ).scalar()
+            break
+        except OperationalError as e:
+            if "database is locked" in str(e).lower() and attempt == 0:
                 continue
-            elif "unique constraint" in error_str or "already exists" in error_str:
-                return False, "Email already registered. Please use a different email."
-            else:
-                return False, f"Registration failed: {str(e)}"
+            return False, f"Registration failed: {str(e)}"
+        except SQLAlchemyError as e:
+            return False, f"Registration failed: {str(e)}"
     
-    return False, "Registration failed after multiple attempts. Please try again."
+    if uid is None:
+        return False, "Email already registered. Please use a different email or try logging in."
+    
+    # Log audit (non-blocking)
+    log_audit(uid, "register", "user", uid, {
+        "role": role,
+        "has_phone": bool(phone)
+    })
+    
+    return True, "Registration successful! Your account is pending admin approval. You will be notified once approved."
 
 def role_guard(required_roles):
     """Check if user has required role permissions"""
@@ -220,6 +352,8 @@ def role_guard(required_roles):
 
 def render_auth_panel():
     """Render authentication panel in sidebar"""
+    cookie_manager = get_cookie_manager()
+    
     with st.sidebar:
         st.header("🔐 Authentication")
         
@@ -247,8 +381,8 @@ def render_auth_panel():
                             with st.spinner("Logging in..."):
                                 ok, msg = auth_login(email, pwd)
                             if ok:
-                                st.success(msg)
-                                time.sleep(1)  # Brief pause to show success message
+                                persist_auth_cookie(cookie_manager)
+                                st.toast(msg)  # Survives the rerun without blocking the script thread
                                 st.rerun()
                             else:
                                 st.error(msg)
@@ -335,9 +469,8 @@ def render_auth_panel():
             
             # Logout button
             if st.button("🚪 Logout", use_container_width=True, type="secondary"):
-                auth_logout()
-                st.success("Logged out successfully!")
-                time.sleep(1)
+                auth_logout(cookie_manager)
+                st.toast("Logged out successfully!")
                 st.rerun()
 
 # Additional utility functions for other modules to use
@@ -366,8 +499,7 @@ def require_auth():
 # Input validation utilities
 def validate_email_format(email):
     """Validate email format without external library"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email.strip()) is not None
+    return _EMAIL_RE.match(email.strip()) is not None
 
 def validate_password_strength(password):
     """Basic password strength validation"""
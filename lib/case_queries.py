@@ -0,0 +1,116 @@
+# lib/case_queries.py - Cached case reads for the cyber dashboard
+from datetime import datetime, timedelta
+import streamlit as st
+from sqlalchemy import select, desc, and_, or_, func, case as sql_case
+from lib.db import get_engine, transactions, cases, audit_logs
+
+# Streamlit reruns the whole page on every widget interaction, so the per-official
+# case reads below are memoized briefly. They live here rather than in the cyber page
+# so the admin handlers that assign cases or decide payments can clear them too
+
+@st.cache_data(ttl=30)
+def fetch_case_overview(user_id):
+    """Case tallies, pending-approval risk buckets and the alert cases named on the overview"""
+    # Payments blocked for approval whose case is still waiting on this official
+    pending_cases = cases.join(transactions, cases.c.transaction_id == transactions.c.id)
+    pending_where = (
+        cases.c.assigned_to == user_id,
+        cases.c.status == "Assigned",
+        transactions.c.status == "Pending Approval",
+    )
+    pending_risk = func.coalesce(transactions.c.risk_score, 0)
+    
+    def pending_count(*where):
+        return select(func.count()).select_from(pending_cases).where(*pending_where, *where).scalar_subquery()
+    
+    with get_engine().connect() as conn:
+        # Every case metric in one aggregate over this official's cases, with the
+        # pending-approval risk buckets riding along as scalar subqueries - one round-trip
+        is_resolved = cases.c.status == "Resolved"
+        is_open = cases.c.status.is_distinct_from("Resolved")
+        stats = conn.execute(
+            select(
+                func.count().label("assigned"),
+                func.count().filter(cases.c.status == "In Review").label("active"),
+                func.count().filter(is_resolved).label("resolved"),
+                func.count().filter(is_resolved, cases.c.finding == "Fraudulent").label("resolved_fraud"),
+                func.count().filter(is_resolved, cases.c.finding == "Safe").label("resolved_safe"),
+                # Same window as the old (now - updated_at).days <= 7 check
+                func.count().filter(is_resolved, cases.c.updated_at > datetime.now() - timedelta(days=8)).label("resolved_this_week"),
+                func.count().filter(cases.c.priority == "High").label("high_priority"),
+                func.count().filter(cases.c.priority.in_(["High", "Critical"])).label("complex"),
+                func.count().filter(is_open, cases.c.priority == "High").label("open_high"),
+                func.count().filter(is_open, cases.c.priority == "Medium").label("open_medium"),
+                func.count().filter(is_open, cases.c.priority == "Low").label("open_low"),
+                pending_count().label("pending_total"),
+                pending_count(pending_risk >= 0.9).label("pending_critical"),
+                pending_count(pending_risk >= 0.8, pending_risk < 0.9).label("pending_high"),
+                pending_count(pending_risk >= 0.6, pending_risk < 0.8).label("pending_medium"),
+            ).where(cases.c.assigned_to == user_id)
+        ).one()
+        
+        # Only the few cases shown by name are fetched - the first three critical and two
+        # high-risk ones, numbered per bucket so both come back in a single query
+        critical_risk_cases, high_risk_cases = [], []
+        if stats.pending_critical or stats.pending_high:
+            bucket = sql_case((pending_risk >= 0.9, "critical"), else_="high")
+            ranked = select(
+                cases.c.id.label("cases_id"),
+                transactions.c.amount.label("transactions_amount"),
+                transactions.c.risk_score.label("transactions_risk_score"),
+                transactions.c.details.label("transactions_details"),
+                bucket.label("bucket"),
+                func.row_number().over(partition_by=bucket, order_by=cases.c.id).label("rank"),
+            ).select_from(pending_cases).where(*pending_where, pending_risk >= 0.8).subquery()
+            alert_rows = conn.execute(
+                select(ranked)
+                .where(or_(
+                    and_(ranked.c.bucket == "critical", ranked.c.rank <= 3),
+                    and_(ranked.c.bucket == "high", ranked.c.rank <= 2),
+                ))
+                .order_by(ranked.c.rank)
+            ).fetchall()
+            critical_risk_cases = [row for row in alert_rows if row.bucket == "critical"]
+            high_risk_cases = [row for row in alert_rows if row.bucket == "high"]
+    
+    return stats, critical_risk_cases, high_risk_cases
+
+@st.cache_data(ttl=30)
+def fetch_recent_activity(user_id):
+    """The official's last 15 audit entries, newest first"""
+    with get_engine().connect() as conn:
+        # FIXED: Only use columns that definitely exist in audit_logs
+        try:
+            return conn.execute(
+                select(audit_logs.c.action, audit_logs.c.created_at, audit_logs.c.details)
+                .where(audit_logs.c.actor_user_id == user_id)
+                .order_by(desc(audit_logs.c.created_at))
+                .limit(15)
+            ).fetchall()
+        except Exception:
+            # Fallback if details column doesn't exist
+            return conn.execute(
+                select(audit_logs.c.action, audit_logs.c.created_at)
+                .where(audit_logs.c.actor_user_id == user_id)
+                .order_by(desc(audit_logs.c.created_at))
+                .limit(15)
+            ).fetchall()
+
+@st.cache_data(ttl=30)
+def fetch_open_cases(user_id):
+    """Assigned and in-review cases joined to their transactions, riskiest first"""
+    with get_engine().connect() as conn:
+        return conn.execute(
+            select(cases, transactions)
+            .join(transactions, cases.c.transaction_id == transactions.c.id)
+            .where(
+                cases.c.assigned_to == user_id,
+                cases.c.status.in_(["Assigned", "In Review"])
+            )
+            .order_by(desc(transactions.c.risk_score), desc(cases.c.created_at))
+        ).fetchall()
+
+def clear_case_caches():
+    """Drop the cached case queues and tallies after cases or their payments change"""
+    fetch_case_overview.clear()
+    fetch_open_cases.clear()
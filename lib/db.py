@@ -1,30 +1,82 @@
 # lib/db.py - Complete fixed schema without meta column issues
-from sqlalchemy import create_engine, Table, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, JSON, MetaData
+from sqlalchemy import create_engine, event, select, update, case, inspect, bindparam, Table, Column, Integer, SmallInteger, String, Float, DateTime, Boolean, ForeignKey, Text, JSON, MetaData, Index, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.util import LRUCache
 from sqlalchemy.sql import func
 import os
 import datetime
+import time
+import hmac
+import base64
+import binascii
 import hashlib
+import functools
 import secrets
+import threading
+from lib.validators import validate_phone, format_phone  # re-exported for existing callers
 
 # Database configuration
 DB_URL = os.getenv("APP_DB_URL", "sqlite:///fraud_app.db")
 
 sqlite_args = {
     "check_same_thread": False,
-    "timeout": 30,
-    "isolation_level": None
 }
 
-_engine = create_engine(
-    DB_URL, 
-    connect_args=sqlite_args if DB_URL.startswith("sqlite") else {},
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=False
+# Per-connection settings, applied once when the pool opens each connection;
+# busy_timeout keeps the old 30s connect timeout. journal_mode=WAL is stored in
+# the database file itself, so init_db sets it once instead.
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=30000",
 )
 
-_session = sessionmaker(bind=_engine, autoflush=False, autocommit=False)
+_COMPILED_CACHE = LRUCache(1200)
+
+@functools.lru_cache(maxsize=1)
+def get_engine():
+    """Create the engine on first use so importing lib.db never touches the database"""
+    if DB_URL.startswith("sqlite"):
+        # Keep SQLite's default pool (QueuePool for files) so connections, their
+        # PRAGMAs and page cache are reused; a file handle never goes stale, so no
+        # checkout ping is needed
+        engine = create_engine(
+            DB_URL,
+            connect_args=sqlite_args,
+            echo=False
+        )
+    else:
+        # Every Streamlit session shares this one engine, so size the pool for
+        # concurrent reruns instead of the default 5 + 10 overflow
+        engine = create_engine(
+            DB_URL, 
+            pool_size=25,
+            max_overflow=25,
+            pool_pre_ping=True,
+            pool_recycle=300,
+            echo=False
+        )
+    
+    if DB_URL.startswith("sqlite"):
+        @event.listens_for(engine, "connect")
+        def _apply_sqlite_pragmas(dbapi_conn, connection_record):
+            cursor = dbapi_conn.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.close()
+    
+    # One bounded compiled-statement cache shared by every connection; the app only
+    # has a few dozen distinct statements so they all stay compiled
+    return engine.execution_options(compiled_cache=_COMPILED_CACHE)
+
+@functools.lru_cache(maxsize=1)
+def _get_sessionmaker():
+    return sessionmaker(bind=get_engine(), autoflush=False, autocommit=False)
+
 _metadata = MetaData()
 
 # Database tables with CORRECTED SCHEMA - NO META COLUMN
@@ -40,6 +92,9 @@ users = Table(
     Column("balance", Float, default=0.0),
     Column("kyc_status", String, default="not_submitted"),
     Column("created_at", DateTime, server_default=func.now()),
+    # Dashboards list users by role and approval status
+    Index("ix_users_role_status", "role", "status"),
+    Index("ix_users_status", "status"),
 )
 
 kyc_docs = Table(
@@ -65,8 +120,31 @@ transactions = Table(
     Column("location", String),
     Column("status", String, default="Success"),
     Column("risk_score", Float, default=0.0),
+    # 0 = low, 1 = medium, 2 = high against the admin thresholds; see refresh_risk_bands
+    Column("risk_band", SmallInteger, default=0),
     Column("details", JSON),
-    Column("created_at", DateTime, server_default=func.now())
+    Column("created_at", DateTime, server_default=func.now()),
+    # Velocity checks range-scan a sender's recent transactions by status
+    Index("ix_transactions_sender_created_status", "sender_id", "created_at", "status"),
+    # Transaction monitoring filters by status and risk band, paging newest-first by id
+    Index("ix_transactions_status_band", "status", "risk_band", "id"),
+    Index("ix_transactions_status_created", "status", "created_at"),
+    Index("ix_transactions_created", "created_at"),
+    Index("ix_transactions_type_created", "transaction_type", "created_at"),
+    Index("ix_transactions_band", "risk_band", "id"),
+    # Small partial index for the review queues the dashboards poll
+    Index(
+        "ix_transactions_review_created", "created_at",
+        postgresql_where=text("status IN ('Flagged', 'Under Review', 'Pending Approval')"),
+        sqlite_where=text("status IN ('Flagged', 'Under Review', 'Pending Approval')"),
+    ),
+    # Payment monitoring pages blocked payments newest-first by id and sums their
+    # amount/risk; only open blocks are indexed, so it stays tiny as history grows
+    Index(
+        "ix_transactions_pending", "id", "amount", "risk_score",
+        postgresql_where=text("status = 'Pending Approval'"),
+        sqlite_where=text("status = 'Pending Approval'"),
+    ),
 )
 
 cases = Table(
@@ -79,7 +157,10 @@ cases = Table(
     Column("report", Text, default=""),
     Column("priority", String, default="Medium"),
     Column("created_at", DateTime, server_default=func.now()),
-    Column("updated_at", DateTime, onupdate=func.now())
+    Column("updated_at", DateTime, onupdate=func.now()),
+    Index("ix_cases_status_assigned", "status", "assigned_to"),
+    # Covers the admin status/finding rollup, so the GROUP BY never touches the table
+    Index("ix_cases_status_finding", "status", "finding"),
 )
 
 tickets = Table(
@@ -101,9 +182,16 @@ audit_logs = Table(
     Column("entity_type", String),
     Column("entity_id", Integer),
     Column("details", String),  # Simple String field only - NO META COLUMN
-    Column("created_at", DateTime, server_default=func.now())
+    Column("amount", Float),  # dollar amount the action moved, when there is one
+    Column("created_at", DateTime, server_default=func.now()),
+    # Payment-approval history filters by action, newest first
+    Index("ix_audit_logs_action_created", "action", "created_at"),
 )
 
+# Recent Activity reads the newest few entries; keeping action and amount in the
+# key makes that an index-only top-N scan with no sort step
+Index("ix_audit_logs_recent", audit_logs.c.created_at.desc(), audit_logs.c.action, audit_logs.c.amount)
+
 settings = Table(
     "settings", _metadata,
     Column("id", Integer, primary_key=True),
@@ -112,44 +200,126 @@ settings = Table(
 )
 
 # Password functions
+# argon2id when argon2-cffi is installed; salted SHA-256 otherwise
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+    _PH = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+except ImportError:
+    _PH = None
+
+# Short-lived verification cache so Streamlit reruns don't repeat the KDF
+_VERIFY_CACHE_TTL = 60  # seconds
+_VERIFY_CACHE_MAX = 1024
+_VERIFY_CACHE_KEY = secrets.token_bytes(32)
+_verify_cache = {}
+_verify_cache_lock = threading.Lock()
+
 def hash_password(password):
-    salt = secrets.token_hex(16)
-    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-    return f"{password_hash}:{salt}"
+    if _PH is not None:
+        return _PH.hash(password)
+    # base64(sha256(password + salt) + salt) with a raw 16-byte salt
+    salt = os.urandom(16)
+    digest = hashlib.sha256(password.encode() + salt).digest()
+    return base64.b64encode(digest + salt).decode()
 
-def verify_password(password, stored_hash):
-    try:
-        password_hash, salt = stored_hash.split(':')
+def _verify_password_uncached(password, stored_hash):
+    if stored_hash.startswith("$argon2"):
+        if _PH is None:
+            return False
+        try:
+            return _PH.verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    
+    # Legacy salted SHA-256 "hash:salt" with a hex salt
+    if ':' in stored_hash:
+        try:
+            password_hash, salt = stored_hash.split(':')
+        except ValueError:
+            return False
         return hashlib.sha256((password + salt).encode()).hexdigest() == password_hash
-    except:
+    
+    # Salted SHA-256 as base64(digest + salt)
+    try:
+        raw = base64.b64decode(stored_hash, validate=True)
+    except (binascii.Error, ValueError):
         return False
+    if len(raw) != 48:
+        return False
+    digest, salt = raw[:32], raw[32:]
+    return hmac.compare_digest(hashlib.sha256(password.encode() + salt).digest(), digest)
 
-# Phone validation and formatting
-def validate_phone(phone):
-    """Validate phone number format"""
-    if not phone:
-        return True  # Phone is optional
+def verify_password(password, stored_hash):
+    if not stored_hash:
+        return False
+    
+    # Keyed digest so the cache never holds anything password-derivable
+    key = hashlib.blake2b(f"{password}\0{stored_hash}".encode(), digest_size=16, key=_VERIFY_CACHE_KEY).digest()
+    now = time.monotonic()
+    with _verify_cache_lock:
+        cached = _verify_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
     
-    # Remove all non-digits
-    digits = ''.join(filter(str.isdigit, phone))
-    return len(digits) == 10
-
-def format_phone(phone):
-    """Format phone number as XXX-XXX-XXXX"""
-    if not phone:
-        return None
+    result = _verify_password_uncached(password, stored_hash)
     
-    digits = ''.join(filter(str.isdigit, phone))
-    if len(digits) == 10:
-        return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
-    return phone
+    with _verify_cache_lock:
+        if len(_verify_cache) >= _VERIFY_CACHE_MAX:
+            for k in [k for k, (expires, _) in _verify_cache.items() if expires <= now]:
+                del _verify_cache[k]
+            if len(_verify_cache) >= _VERIFY_CACHE_MAX:
+                del _verify_cache[next(iter(_verify_cache))]
+        _verify_cache[key] = (now + _VERIFY_CACHE_TTL, result)
+    return result
+
+# Columns added after the first release; create_all won't add them to existing tables
+_ADDED_COLUMNS = [(transactions, "risk_band"), (audit_logs, "amount")]
+
+# Indexes no query uses any more; dropped so they stop costing every payment INSERT
+_DROPPED_INDEXES = ["ix_transactions_status_risk", "ix_transactions_risk_score"]
+
+def risk_band_case(flag_threshold, block_threshold, score=transactions.c.risk_score):
+    """SQL expression classifying a risk score as 0 (low), 1 (medium) or 2 (high)"""
+    score = func.coalesce(score, 0)
+    return case((score >= block_threshold, 2), (score >= flag_threshold, 1), else_=0)
+
+def refresh_risk_bands(conn, flag_threshold, block_threshold, only_missing=False):
+    """Recompute the stored risk_band column, e.g. after the admin thresholds change"""
+    stmt = update(transactions).values(risk_band=risk_band_case(flag_threshold, block_threshold))
+    if only_missing:
+        stmt = stmt.where(transactions.c.risk_band.is_(None))
+    conn.execute(stmt)
+
+def dialect_insert(conn, table):
+    """An INSERT for the connection's backend, so .on_conflict_do_nothing() works on SQLite and PostgreSQL"""
+    if conn.dialect.name == "postgresql":
+        return postgresql_insert(table)
+    return sqlite_insert(table)
 
 def init_db():
-    _metadata.create_all(_engine)
+    engine = get_engine()
+    if engine.dialect.name == "sqlite":
+        # Persistent in the database file: lets readers proceed during writes
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    _metadata.create_all(engine)
+    
+    # create_all skips tables that already exist, so add any newer columns and indexes explicitly
+    with engine.begin() as conn:
+        for table, name in _ADDED_COLUMNS:
+            if name not in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+                col_type = table.c[name].type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {col_type}"))
+        for name in _DROPPED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        for table in _metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
     
     from sqlalchemy import select, insert
     
-    with _engine.begin() as conn:
+    with engine.begin() as conn:
         # System settings
         default_settings = {
             "tx_limit_amount": 5000.0,
@@ -164,6 +334,10 @@ def init_db():
         if not existing_settings:
             conn.execute(insert(settings).values(key="system", value=default_settings))
         
+        # Backfill bands for rows written before the column existed
+        sys_cfg = existing_settings.value if existing_settings else default_settings
+        refresh_risk_bands(conn, sys_cfg.get("flag_threshold", 0.4), sys_cfg.get("block_threshold", 0.7), only_missing=True)
+        
         # Default users with proper balances
         default_users = [
             ("System Administrator", "admin@fraud-detect.local", "555-000-0001", "admin", "admin123", "approved", 100000.0),
@@ -173,31 +347,78 @@ def init_db():
             ("Mike Johnson", "user3@fraud-detect.local", "555-000-0005", "user", "user123", "approved", 5000.0)
         ]
         
-        for name, email, phone, role, password, status, balance in default_users:
-            existing = conn.execute(select(users).where(users.c.email == email)).fetchone()
-            if not existing:
-                password_hash = hash_password(password)
-                conn.execute(insert(users).values(
-                    name=name, email=email, phone=phone, role=role,
-                    password_hash=password_hash, status=status, balance=balance,
-                    kyc_status="submitted" if role == "user" else "not_applicable"
-                ))
+        # One lookup for all seed emails so only missing users get hashed
+        existing_emails = set(conn.execute(
+            select(users.c.email).where(users.c.email.in_([u[1] for u in default_users]))
+        ).scalars())
 
-def get_engine():
-    return _engine
+        new_users = [
+            {
+                "name": name, "email": email, "phone": phone, "role": role,
+                "password_hash": hash_password(password), "status": status, "balance": balance,
+                "kyc_status": "submitted" if role == "user" else "not_applicable"
+            }
+            for name, email, phone, role, password, status, balance in default_users
+            if email not in existing_emails
+        ]
+
+        if new_users:
+            # Single executemany; ON CONFLICT covers a concurrent seeder racing us
+            conn.execute(
+                dialect_insert(conn, users).on_conflict_do_nothing(index_elements=["email"]),
+                new_users
+            )
+
+# Process-local login lookup cache: email -> (expires_at, row)
+_USER_CACHE_TTL = 300  # seconds
+_USER_CACHE = {}
+_user_cache_lock = threading.RLock()
+
+# Built once; SQLAlchemy's compiled cache reuses the statement across lookups
+_USER_BY_EMAIL = (
+    select(users.c.id, users.c.status, users.c.password_hash,
+           users.c.role, users.c.email, users.c.name)
+    .where(users.c.email == bindparam("email"))
+    .limit(1)
+)
+
+def get_user_by_email(email):
+    """Return the login columns for a user, served from memory when fresh"""
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _USER_CACHE.get(email)
+        if cached and cached[0] > now:
+            return cached[1]
+    
+    with get_engine().connect() as conn:
+        user = conn.execute(_USER_BY_EMAIL, {"email": email}).first()
+    
+    # Only cache hits so a fresh registration is visible immediately
+    if user:
+        with _user_cache_lock:
+            _USER_CACHE[email] = (now + _USER_CACHE_TTL, user)
+    return user
+
+def invalidate_user_cache(email=None):
+    """Drop one cached user, or the whole cache when no email is given"""
+    with _user_cache_lock:
+        if email is None:
+            _USER_CACHE.clear()
+        else:
+            _USER_CACHE.pop(email, None)
 
 def get_session():
-    return _session()
+    return _get_sessionmaker()()
 
 def get_user_balance(user_id):
     """Get current user balance from database"""
     from sqlalchemy import select
-    with _engine.begin() as conn:
+    with get_engine().begin() as conn:
         user = conn.execute(select(users.c.balance).where(users.c.id == user_id)).fetchone()
         return user.balance if user else 0.0
 
 def update_user_balance(user_id, new_balance):
     """Update user balance in database"""
     from sqlalchemy import update
-    with _engine.begin() as conn:
+    with get_engine().begin() as conn:
         conn.execute(update(users).where(users.c.id == user_id).values(balance=new_balance))
@@ -0,0 +1,59 @@
+# lib/dbdebug.py - Per-render query counting for spotting N+1 patterns in development
+import contextlib
+import functools
+import logging
+import os
+import threading
+from sqlalchemy import event
+from lib.db import get_engine
+
+# Off unless APP_DEBUG_QUERIES is set, in which case render functions log their query counts
+DEBUG_QUERIES = os.getenv("APP_DEBUG_QUERIES", "").lower() not in ("", "0", "false")
+
+logger = logging.getLogger("dbdebug")
+if DEBUG_QUERIES:
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler())
+    logger.propagate = False
+
+@contextlib.contextmanager
+def count_queries(engine=None):
+    """Collect the SQL statements this thread sends through the engine while the block runs"""
+    engine = engine or get_engine()
+    statements = []
+    thread_id = threading.get_ident()
+
+    # Each Streamlit session reruns on its own thread, so ignore other sessions' queries
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread_id:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+def log_query_count(max_queries=None):
+    """Decorator logging how many queries a render function issued, warning above max_queries.
+
+    Returns the function unchanged when query debugging is off, so production pays nothing.
+    """
+    def decorate(render):
+        if not DEBUG_QUERIES:
+            return render
+
+        @functools.wraps(render)
+        def wrapper(*args, **kwargs):
+            with count_queries() as statements:
+                try:
+                    return render(*args, **kwargs)
+                finally:
+                    # st.rerun() raises out of the render, so log on every exit path
+                    if max_queries is not None and len(statements) > max_queries:
+                        logger.warning("%s issued %d queries (budget %d):\n%s", render.__name__,
+                                       len(statements), max_queries, "\n".join(statements))
+                    else:
+                        logger.info("%s issued %d queries", render.__name__, len(statements))
+        return wrapper
+    return decorate
@@ -1,24 +1,33 @@
 # lib/device_fingerprint.py - Device fingerprinting simulation
 import hashlib
-import json
+import functools
 import random
 from datetime import datetime
 
+# Suspicious screen resolutions (common for emulators)
+_SUSPICIOUS_RES = frozenset({"800x600", "1024x768", "320x240"})
+
+@functools.lru_cache(maxsize=4096)
+def _hash_device(user_agent, screen_res, timezone, language, ip):
+    """Return (fingerprint, ip_hash); the same browser repeats these inputs every request"""
+    ip_hash = hashlib.blake2b(ip.encode(), digest_size=4).hexdigest()
+    buf = f"{user_agent}|{screen_res}|{timezone}|{language}|{ip_hash}".encode()
+    return hashlib.blake2b(buf, digest_size=32).hexdigest(), ip_hash
+
 class DeviceFingerprint:
     def __init__(self):
         self.known_devices = {}  # Store device fingerprints
     
     def generate_fingerprint(self, user_agent, screen_res, timezone, language, ip):
         """Generate device fingerprint from browser data"""
+        fingerprint, ip_hash = _hash_device(user_agent, screen_res, timezone, language, ip)
         device_data = {
             "user_agent": user_agent,
             "screen_resolution": screen_res,
             "timezone": timezone,
             "language": language,
-            "ip_hash": hashlib.md5(ip.encode()).hexdigest()[:8]
+            "ip_hash": ip_hash
         }
-        
-        fingerprint = hashlib.sha256(json.dumps(device_data, sort_keys=True).encode()).hexdigest()
         return fingerprint, device_data
     
     def assess_device_risk(self, fingerprint, device_data, user_id):
@@ -33,24 +42,23 @@ class DeviceFingerprint:
             risk_factors.append("New device")
         
         # Check for risky characteristics
-        if "mobile" not in device_data["user_agent"].lower():
+        ua_lower = device_data["user_agent"].lower()
+        tz_lower = device_data["timezone"].lower()
+        
+        if "mobile" not in ua_lower:
             risk_score += 0.1
             risk_factors.append("Desktop device")
         
-        if "unknown" in device_data["timezone"].lower():
+        if "unknown" in tz_lower:
             risk_score += 0.2
             risk_factors.append("Unknown timezone")
         
-        # Suspicious screen resolutions (common for emulators)
-        suspicious_resolutions = ["800x600", "1024x768", "320x240"]
-        if device_data["screen_resolution"] in suspicious_resolutions:
+        if device_data["screen_resolution"] in _SUSPICIOUS_RES:
             risk_score += 0.4
             risk_factors.append("Suspicious screen resolution")
         
         # Store device for future reference
-        if user_id not in self.known_devices:
-            self.known_devices[user_id] = set()
-        self.known_devices[user_id].add(fingerprint)
+        self.known_devices.setdefault(user_id, set()).add(fingerprint)
         
         return min(risk_score, 1.0), risk_factors
 
@@ -3,33 +3,245 @@ import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
+import os
 import datetime
 import json
+import tempfile
+import joblib
+
+# Optional native predictor - the forest is compiled to a shared library when
+# treelite/tl2cgen and a C toolchain are available; sklearn is the fallback
+try:
+    import treelite
+    import tl2cgen
+except ImportError:
+    treelite = tl2cgen = None
+
+# Optional JIT for the packed-forest traversal; sklearn is used when numba is missing
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Packed node columns: feature (-1 at leaves), threshold, left, right, leaf P(fraud)
+_FEAT, _THR, _LEFT, _RIGHT, _VALUE = range(5)
+
+# Samples walked through the same tree together; their node loads are independent,
+# so the CPU can keep several cache misses in flight
+_LANES = 8
+
+def _predict_packed(nodes, roots, X_T, out):
+    """Average leaf P(fraud) over all trees; nodes is one contiguous (n_nodes, 5) float32
+    array and X_T holds features as rows (n_features, n_samples)"""
+    n = X_T.shape[1]
+    n_trees = roots.shape[0]
+    idx = np.empty(_LANES, dtype=np.int64)
+    for start in range(0, n, _LANES):
+        width = min(_LANES, n - start)
+        acc = np.zeros(_LANES, dtype=np.float64)
+        for t in range(n_trees):
+            for lane in range(width):
+                idx[lane] = roots[t]
+            active = width
+            while active > 0:
+                active = 0
+                for lane in range(width):
+                    j = idx[lane]
+                    if nodes[j, _FEAT] >= 0:
+                        left = int(nodes[j, _LEFT])
+                        right = int(nodes[j, _RIGHT])
+                        # Branch-free child select: left + go_right * (right - left)
+                        go_right = X_T[int(nodes[j, _FEAT]), start + lane] > nodes[j, _THR]
+                        idx[lane] = left + go_right * (right - left)
+                        active += 1
+            for lane in range(width):
+                acc[lane] += nodes[idx[lane], _VALUE]
+        for lane in range(width):
+            out[start + lane] = acc[lane] / n_trees
+
+def _predict_quantized(nodes_q, leaf_values, roots, Xq, out):
+    """Integer-compare variant of _predict_packed over int16-quantized inputs and thresholds"""
+    n_trees = roots.shape[0]
+    for i in range(Xq.shape[0]):
+        acc = 0.0
+        for t in range(n_trees):
+            idx = roots[t]
+            while nodes_q[idx, 0] >= 0:
+                left = nodes_q[idx, 2]
+                right = nodes_q[idx, 3]
+                go_right = Xq[i, nodes_q[idx, 0]] > nodes_q[idx, 1]
+                idx = left + go_right * (right - left)
+            acc += leaf_values[idx]
+        out[i] = acc / n_trees
+
+def _preorder(children_left, children_right):
+    """Node ids of one tree in DFS preorder (node, left subtree, right subtree)"""
+    order = []
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if children_left[node] != -1:
+            stack.append(children_right[node])
+            stack.append(children_left[node])
+    return np.asarray(order, dtype=np.int64)
+
+def _aligned_empty(shape, dtype, align=64):
+    """Uninitialized C-contiguous array whose data starts on an `align`-byte boundary"""
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + align, dtype=np.uint8)
+    start = -raw.ctypes.data % align
+    return raw[start:start + nbytes].view(dtype).reshape(shape)
+
+# Categorical inputs are coded in Python once per batch so the kernel sees only numbers
+_UNUSUAL_LOCS = frozenset({"Unknown", "High-Risk-Geo"})
+_RISKY_DEVICES = frozenset({"emulator", "rooted", "unknown"})
+
+def _batch_to_soa(txs, histories):
+    """Split transaction dicts into one typed array per input field"""
+    n = len(txs)
+    amount = np.empty(n, dtype=np.float64)
+    hour = np.empty(n, dtype=np.float64)
+    failed = np.empty(n, dtype=np.float64)
+    sender_balance = np.empty(n, dtype=np.float64)
+    loc_code = np.empty(n, dtype=np.int8)
+    device_code = np.empty(n, dtype=np.int8)
+    recipient_new = np.empty(n, dtype=np.bool_)
+    history = np.zeros((n, 4), dtype=np.float64)  # amount_1h, amount_24h, count_1h, count_24h
+    
+    for i, (tx, user_history) in enumerate(zip(txs, histories)):
+        amount[i] = float(tx.get("amount", 0))
+        hour[i] = int(tx.get("hour", 12))
+        failed[i] = int(tx.get("failed_attempts", 0))
+        sender_balance[i] = float(tx.get("sender_balance", 1000))
+        loc_code[i] = tx.get("location") in _UNUSUAL_LOCS
+        device_code[i] = tx.get("device", "").lower() in _RISKY_DEVICES
+        recipient_new[i] = bool(tx.get("recipient_new", False))
+        if user_history:
+            history[i, 0] = user_history.get("amount_1h", 0)
+            history[i, 1] = user_history.get("amount_24h", 0)
+            history[i, 2] = user_history.get("count_1h", 0)
+            history[i, 3] = user_history.get("count_24h", 0)
+    
+    return amount, hour, failed, sender_balance, loc_code, device_code, recipient_new, history
+
+def _extract_batch(amount, hour, failed, sender_balance, loc_code, device_code,
+                   recipient_new, history, day_of_week, out):
+    """Fill the (N, 13) feature matrix in the same column order as _feature_values"""
+    for i in range(amount.shape[0]):
+        a = amount[i]
+        out[i, 0] = a
+        out[i, 1] = hour[i]
+        out[i, 2] = day_of_week
+        out[i, 3] = failed[i]
+        out[i, 4] = loc_code[i]
+        out[i, 5] = device_code[i]
+        out[i, 6] = history[i, 0]
+        out[i, 7] = history[i, 1]
+        out[i, 8] = history[i, 2]
+        out[i, 9] = history[i, 3]
+        out[i, 10] = 1.0 if recipient_new[i] else 0.0
+        out[i, 11] = min(a / sender_balance[i], 1.0) if sender_balance[i] > 0 else 1.0
+        out[i, 12] = 1.0 if a % 100 == 0 and a >= 100 else 0.0
+
+if njit is not None:
+    _extract_batch = njit(cache=True)(_extract_batch)
+    _predict_packed = njit(cache=True)(_predict_packed)
+    _predict_quantized = njit(cache=True)(_predict_quantized)
+
+# Trained model is persisted next to the database so later processes skip the fit
+_MODEL_PATH = os.getenv("APP_MODEL_PATH", "fraud_rf.joblib")
 
 class AdvancedFraudModel:
-    def __init__(self):
+    def __init__(self, quantize=False):
+        # quantize=True scores with int16 features/thresholds: smaller nodes and integer
+        # compares, but values sharing a quantization bucket with a split go left. That is
+        # lossy - with fresh random probes up to ~9% of rows changed score, by as much as
+        # 0.27 - so nothing in the app passes quantize=True; it is an experiment only
+        self.quantize = quantize
         self.model = RandomForestClassifier(n_estimators=100, random_state=42)
         self.scaler = StandardScaler()
         self.trained = False
+        self._compiled = None
+        self._build_dir = None
+        self._packed_nodes = None
+        self._packed_roots = None
+        self._feat_importance = {}
+        self._q_nodes = None
+        self._q_leaf = None
+        self._q_offset = None
+        self._q_scale = None
+        self._mean = None
+        self._inv_scale = None
         self.feature_names = [
             'amount', 'hour', 'day_of_week', 'failed_attempts', 'unusual_location',
             'device_risk', 'amount_velocity_1h', 'amount_velocity_24h', 'tx_count_1h',
             'tx_count_24h', 'recipient_new', 'sender_balance_ratio', 'round_amount'
         ]
+        
+        # Load or train up front so the first transaction never pays for the fit
+        if not self._load():
+            accuracy = self.fit_realistic_data()
+            print(f"Model trained with accuracy: {accuracy:.3f}")
+            self._save()
 
-    def _extract_features(self, tx, user_history=None):
-        """Extract realistic fraud detection features"""
+    def _load(self):
+        """Restore a previously trained model, memory-mapping the forest arrays"""
+        try:
+            saved = joblib.load(_MODEL_PATH, mmap_mode="r")
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            # Truncated, corrupt or version-incompatible pickle: retrain and overwrite it
+            print(f"Could not load saved model, retraining: {e}")
+            return False
+        if not isinstance(saved, dict) or saved.get("feature_names") != self.feature_names:
+            return False
+        
+        self.model = saved["model"]
+        self.scaler = saved["scaler"]
+        self._mean = saved["mean"]
+        self._inv_scale = saved["inv_scale"]
+        self._q_offset = saved.get("q_offset")
+        self._q_scale = saved.get("q_scale")
+        self.trained = True
+        self._cache_feature_importance()
+        self._pack_trees()
+        self._compile_native()
+        return True
+
+    def _save(self):
+        """Persist the trained model uncompressed so it can be memory-mapped"""
+        try:
+            # Write then rename so a concurrent loader never sees a partial file
+            tmp_path = f"{_MODEL_PATH}.{os.getpid()}.tmp"
+            joblib.dump({
+                "feature_names": self.feature_names,
+                "model": self.model,
+                "scaler": self.scaler,
+                "mean": self._mean,
+                "inv_scale": self._inv_scale,
+                "q_offset": self._q_offset,
+                "q_scale": self._q_scale,
+            }, tmp_path, compress=0)
+            os.replace(tmp_path, _MODEL_PATH)
+        except OSError as e:
+            print(f"Could not save trained model: {e}")
+
+    def _feature_values(self, tx, user_history=None, day_of_week=None):
+        """Extract realistic fraud detection features as a plain tuple"""
         amount = float(tx.get("amount", 0))
         hour = int(tx.get("hour", 12))
-        day_of_week = datetime.datetime.now().weekday()
+        if day_of_week is None:
+            day_of_week = datetime.datetime.now().weekday()
         failed_attempts = int(tx.get("failed_attempts", 0))
         
         # Location risk
-        unusual_location = 1 if tx.get("location") in ["Unknown", "High-Risk-Geo"] else 0
+        unusual_location = 1 if tx.get("location") in _UNUSUAL_LOCS else 0
         
         # Device risk
-        risky_devices = ["emulator", "rooted", "unknown"]
-        device_risk = 1 if tx.get("device", "").lower() in risky_devices else 0
+        device_risk = 1 if tx.get("device", "").lower() in _RISKY_DEVICES else 0
         
         # Velocity features (would be calculated from user_history in real system)
         amount_velocity_1h = user_history.get("amount_1h", 0) if user_history else 0
@@ -45,87 +257,219 @@ class AdvancedFraudModel:
         # Amount pattern
         round_amount = 1 if amount % 100 == 0 and amount >= 100 else 0
         
-        return np.array([
+        return (
             amount, hour, day_of_week, failed_attempts, unusual_location,
             device_risk, amount_velocity_1h, amount_velocity_24h, tx_count_1h,
             tx_count_24h, recipient_new, sender_balance_ratio, round_amount
-        ])
+        )
+
+    def _extract_features(self, tx, user_history=None):
+        """Extract realistic fraud detection features"""
+        return np.array(self._feature_values(tx, user_history))
 
     def fit_realistic_data(self):
         """Train with more realistic synthetic data"""
-        X = []
-        y = []
-        
-        # Generate realistic training data
-        for _ in range(2000):
-            # Normal transactions
-            amount = np.random.lognormal(4, 1)  # Log-normal distribution for amounts
-            hour = np.random.randint(6, 23)  # Normal hours
-            day_of_week = np.random.randint(0, 7)
-            failed_attempts = np.random.choice([0, 1], p=[0.9, 0.1])
-            unusual_location = 0
-            device_risk = 0
-            amount_velocity_1h = np.random.exponential(50)
-            amount_velocity_24h = np.random.exponential(200)
-            tx_count_1h = np.random.poisson(1)
-            tx_count_24h = np.random.poisson(5)
-            recipient_new = np.random.choice([0, 1], p=[0.7, 0.3])
-            sender_balance_ratio = np.random.uniform(0, 0.3)  # Normal spending ratio
-            round_amount = np.random.choice([0, 1], p=[0.8, 0.2])
-            
-            X.append([amount, hour, day_of_week, failed_attempts, unusual_location,
-                     device_risk, amount_velocity_1h, amount_velocity_24h, tx_count_1h,
-                     tx_count_24h, recipient_new, sender_balance_ratio, round_amount])
-            y.append(0)  # Normal transaction
+        # Generate realistic training data - one vectorized draw per column
+        rng = np.random.default_rng(42)
+        
+        # Normal transactions
+        n = 2000
+        X_norm = np.column_stack([
+            rng.lognormal(4, 1, n),  # Log-normal distribution for amounts
+            rng.integers(6, 23, n),  # Normal hours
+            rng.integers(0, 7, n),  # day_of_week
+            rng.choice([0, 1], size=n, p=[0.9, 0.1]),  # failed_attempts
+            np.zeros(n),  # unusual_location
+            np.zeros(n),  # device_risk
+            rng.exponential(50, n),  # amount_velocity_1h
+            rng.exponential(200, n),  # amount_velocity_24h
+            rng.poisson(1, n),  # tx_count_1h
+            rng.poisson(5, n),  # tx_count_24h
+            rng.choice([0, 1], size=n, p=[0.7, 0.3]),  # recipient_new
+            rng.uniform(0, 0.3, n),  # Normal spending ratio
+            rng.choice([0, 1], size=n, p=[0.8, 0.2]),  # round_amount
+        ])
         
         # Fraudulent transactions
-        for _ in range(500):
-            amount = np.random.lognormal(6, 1.5)  # Larger amounts
-            hour = np.random.choice([2, 3, 4, 23, 0, 1])  # Unusual hours
-            day_of_week = np.random.randint(0, 7)
-            failed_attempts = np.random.choice([2, 3, 4, 5], p=[0.3, 0.3, 0.2, 0.2])
-            unusual_location = np.random.choice([0, 1], p=[0.3, 0.7])
-            device_risk = np.random.choice([0, 1], p=[0.4, 0.6])
-            amount_velocity_1h = np.random.exponential(500)  # High velocity
-            amount_velocity_24h = np.random.exponential(2000)
-            tx_count_1h = np.random.poisson(5)  # Many transactions
-            tx_count_24h = np.random.poisson(20)
-            recipient_new = np.random.choice([0, 1], p=[0.3, 0.7])  # Often new recipients
-            sender_balance_ratio = np.random.uniform(0.5, 1.0)  # High spending ratio
-            round_amount = np.random.choice([0, 1], p=[0.4, 0.6])  # More round amounts
-            
-            X.append([amount, hour, day_of_week, failed_attempts, unusual_location,
-                     device_risk, amount_velocity_1h, amount_velocity_24h, tx_count_1h,
-                     tx_count_24h, recipient_new, sender_balance_ratio, round_amount])
-            y.append(1)  # Fraudulent transaction
+        m = 500
+        X_fraud = np.column_stack([
+            rng.lognormal(6, 1.5, m),  # Larger amounts
+            rng.choice([2, 3, 4, 23, 0, 1], size=m),  # Unusual hours
+            rng.integers(0, 7, m),  # day_of_week
+            rng.choice([2, 3, 4, 5], size=m, p=[0.3, 0.3, 0.2, 0.2]),  # failed_attempts
+            rng.choice([0, 1], size=m, p=[0.3, 0.7]),  # unusual_location
+            rng.choice([0, 1], size=m, p=[0.4, 0.6]),  # device_risk
+            rng.exponential(500, m),  # High velocity
+            rng.exponential(2000, m),  # amount_velocity_24h
+            rng.poisson(5, m),  # Many transactions
+            rng.poisson(20, m),  # tx_count_24h
+            rng.choice([0, 1], size=m, p=[0.3, 0.7]),  # Often new recipients
+            rng.uniform(0.5, 1.0, m),  # High spending ratio
+            rng.choice([0, 1], size=m, p=[0.4, 0.6]),  # More round amounts
+        ])
         
-        X = np.array(X)
-        y = np.array(y)
+        X = np.vstack([X_norm, X_fraud])
+        y = np.concatenate([np.zeros(n, dtype=np.int8), np.ones(m, dtype=np.int8)])
         
         # Scale features
-        X_scaled = self.scaler.fit_transform(X)
+        self.scaler.fit(X)
+        # Raw float32 copies so scoring can skip StandardScaler.transform's validation
+        self._mean = self.scaler.mean_.astype(np.float32)
+        self._inv_scale = (1.0 / self.scaler.scale_).astype(np.float32)
+        # Train on exactly the float32 values inference will produce, so no split
+        # threshold can land between the training and scoring roundings
+        X_scaled = (X.astype(np.float32) - self._mean) * self._inv_scale
+        
+        # Per-feature affine map of the training range onto int16 for quantized scoring
+        lo = X_scaled.min(axis=0)
+        span = X_scaled.max(axis=0) - lo
+        self._q_offset = lo
+        self._q_scale = 65534.0 / np.where(span > 0, span, 1.0)
         
         # Train model
         self.model.fit(X_scaled, y)
         self.trained = True
+        self._cache_feature_importance()
+        self._pack_trees()
+        self._compile_native(X_scaled)
         
         return self.model.score(X_scaled, y)
 
-    def predict_proba(self, tx, user_history=None):
-        """Predict fraud probability with enhanced features"""
-        if not self.trained:
-            accuracy = self.fit_realistic_data()
-            print(f"Model trained with accuracy: {accuracy:.3f}")
+    def _cache_feature_importance(self):
+        """feature_importances_ re-aggregates every tree on each access, so compute it once"""
+        self._feat_importance = dict(zip(self.feature_names, self.model.feature_importances_.tolist()))
+
+    def _pack_trees(self):
+        """Flatten every fitted tree into one contiguous float32 node array for the JIT kernel"""
+        self._packed_nodes = self._packed_roots = None
+        if njit is None:
+            return
         
-        features = self._extract_features(tx, user_history).reshape(1, -1)
-        features_scaled = self.scaler.transform(features)
-        prob = self.model.predict_proba(features_scaled)[0, 1]
+        trees = [est.tree_ for est in self.model.estimators_]
+        nodes = _aligned_empty((sum(t.node_count for t in trees), 5), np.float32)
+        roots = []
+        offset = 0
+        for tree in trees:
+            n = tree.node_count
+            # Re-emit in DFS preorder so every left child directly follows its parent
+            order = _preorder(tree.children_left, tree.children_right)
+            new_index = np.empty(n, dtype=np.int64)
+            new_index[order] = np.arange(offset, offset + n)
+            
+            left = tree.children_left[order]
+            right = tree.children_right[order]
+            leaf = left == -1
+            block = nodes[offset:offset + n]
+            
+            block[:, _FEAT] = np.where(leaf, -1, tree.feature[order])
+            # sklearn tests float32(x) <= float64 threshold; rounding the threshold down
+            # to float32 keeps that comparison exact
+            thr64 = tree.threshold[order]
+            thr = thr64.astype(np.float32)
+            too_high = thr.astype(np.float64) > thr64
+            thr[too_high] = np.nextafter(thr[too_high], np.float32(-np.inf))
+            block[:, _THR] = thr
+            block[:, _LEFT] = np.where(leaf, 0, new_index[np.where(leaf, 0, left)])
+            block[:, _RIGHT] = np.where(leaf, 0, new_index[np.where(leaf, 0, right)])
+            
+            counts = tree.value[order, 0, :]
+            block[:, _VALUE] = counts[:, 1] / counts.sum(axis=1)
+            
+            roots.append(offset)
+            offset += n
+        
+        self._packed_nodes = nodes
+        self._packed_roots = np.asarray(roots, dtype=np.int64)
         
-        return float(prob)
+        self._q_nodes = None
+        if self.quantize and self._q_scale is not None:
+            # Same layout as int32; thresholds go through the input quantizer so the
+            # comparison stays monotonic
+            nodes = self._packed_nodes
+            feat = nodes[:, _FEAT].astype(np.int32)
+            split = feat >= 0
+            thr_q = np.zeros(len(nodes), dtype=np.int32)
+            thr_q[split] = self._quantize_values(
+                nodes[split, _THR].astype(np.float64), feat[split]
+            )
+            self._q_nodes = np.ascontiguousarray(np.column_stack([
+                feat, thr_q, nodes[:, _LEFT].astype(np.int32), nodes[:, _RIGHT].astype(np.int32)
+            ]))
+            self._q_leaf = np.ascontiguousarray(nodes[:, _VALUE])
+
+    def _quantize_values(self, values, features=None):
+        """Map scaled feature values to int16 buckets; features selects per-value columns"""
+        offset = self._q_offset if features is None else self._q_offset[features]
+        scale = self._q_scale if features is None else self._q_scale[features]
+        q = np.floor((values - offset) * scale) - 32767
+        return np.clip(q, -32768, 32767).astype(np.int16)
+
+    def _compile_native(self, X_scaled=None):
+        """Compile the fitted forest with TL2cgen, using training data for branch annotation when given"""
+        self._compiled = None
+        self._build_dir = None
+        if tl2cgen is None:
+            return
+        try:
+            # Fresh directory per build so a loaded library is never overwritten in place;
+            # it lives as long as the predictor and is removed when replaced or collected
+            build_dir = tempfile.TemporaryDirectory(prefix="fraud_rf_")
+            annotation = os.path.join(build_dir.name, "annotation.json")
+            libpath = os.path.join(build_dir.name, "fraud_rf.so")
+            
+            tl_model = treelite.sklearn.import_model(self.model)
+            params = {"parallel_comp": 8}
+            if X_scaled is not None:
+                tl2cgen.annotate_branch(tl_model, tl2cgen.DMatrix(X_scaled), path=annotation)
+                params["annotate_in"] = annotation
+            tl2cgen.export_lib(tl_model, toolchain="gcc", libpath=libpath, params=params)
+            self._compiled = tl2cgen.Predictor(libpath)
+            self._build_dir = build_dir
+        except Exception as e:
+            print(f"Native predictor unavailable, using sklearn: {e}")
+
+    def predict_proba_batch(self, txs, histories=None):
+        """Predict fraud probabilities for a list of transactions in one scaler/forest call"""
+        n = len(txs)
+        if n == 0:
+            # The scaler and every forest backend reject a zero-row matrix
+            return np.empty(0)
+        if histories is None:
+            histories = [None] * n
+        day_of_week = datetime.datetime.now().weekday()
+        
+        X = np.empty((n, len(self.feature_names)), dtype=np.float32)
+        if njit is not None:
+            _extract_batch(*_batch_to_soa(txs, histories), day_of_week, X)
+        else:
+            for i, (tx, user_history) in enumerate(zip(txs, histories)):
+                X[i] = self._feature_values(tx, user_history, day_of_week)
+        
+        # Inline standardization: (X - mean) / scale, in place
+        X -= self._mean
+        X *= self._inv_scale
+        features_scaled = X
+        if self._compiled is not None:
+            # Output is (rows, targets, classes); the last column is P(fraud)
+            probs = np.asarray(self._compiled.predict(tl2cgen.DMatrix(features_scaled))).reshape(n, -1)[:, -1]
+        elif self._q_nodes is not None:
+            probs = np.empty(n, dtype=np.float64)
+            Xq = self._quantize_values(features_scaled)
+            _predict_quantized(self._q_nodes, self._q_leaf, self._packed_roots, Xq, probs)
+        elif self._packed_nodes is not None:
+            probs = np.empty(n, dtype=np.float64)
+            # Feature-major copy so each lane's lookups for one feature are adjacent
+            X_T = np.ascontiguousarray(features_scaled.T)
+            _predict_packed(self._packed_nodes, self._packed_roots, X_T, probs)
+        else:
+            probs = self.model.predict_proba(features_scaled)[:, 1]
+        
+        return probs
+
+    def predict_proba(self, tx, user_history=None):
+        """Predict fraud probability with enhanced features"""
+        return float(self.predict_proba_batch([tx], [user_history])[0])
 
     def get_feature_importance(self):
         """Get feature importance for explainability"""
-        if self.trained:
-            importance = self.model.feature_importances_
-            return dict(zip(self.feature_names, importance))
-        return {}
+        return self._feat_importance
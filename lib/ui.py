@@ -1,36 +1,39 @@
 # lib/ui.py
 import streamlit as st
 
+# Built once at import; Streamlit drops elements a rerun doesn't emit, so the
+# markup still has to be sent every run, but never rebuilt
+_BRAND_HTML = """
+<style>
+.brand-bar {
+    padding: 10px 16px;
+    border-radius: 10px;
+    background: linear-gradient(90deg,#0f172a,#1e293b);
+    color: #e2e8f0;
+    margin-bottom: 10px;
+}
+.brand-title { font-size: 20px; font-weight: 700; }
+.brand-sub { font-size: 13px; opacity: 0.8; }
+</style>
+<div class="brand-bar">
+    <div class="brand-title">🔒 Online Payment Fraud Detection</div>
+    <div class="brand-sub">Real-time flags, case workflow, and auditability</div>
+</div>
+"""
+
+_STAT_CARD_HTML = (
+    '<div style="border-radius:12px;padding:16px;background:#0b1220;border:1px solid #1f2a44;">'
+    '<div style="font-size:12px;opacity:0.7;">{title}</div>'
+    '<div style="font-size:24px;font-weight:700;color:{color}">{icon} {value}</div>'
+    '</div>'
+)
+
 def topbar_brand():
-    st.markdown(
-        """
-        <style>
-        .brand-bar {
-            padding: 10px 16px;
-            border-radius: 10px;
-            background: linear-gradient(90deg,#0f172a,#1e293b);
-            color: #e2e8f0;
-            margin-bottom: 10px;
-        }
-        .brand-title { font-size: 20px; font-weight: 700; }
-        .brand-sub { font-size: 13px; opacity: 0.8; }
-        </style>
-        <div class="brand-bar">
-            <div class="brand-title">🔒 Online Payment Fraud Detection</div>
-            <div class="brand-sub">Real-time flags, case workflow, and auditability</div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+    st.markdown(_BRAND_HTML, unsafe_allow_html=True)
 
 def stat_card(title, value, icon="📊", color="#0ea5e9"):
     st.markdown(
-        f"""
-        <div style="border-radius:12px;padding:16px;background:#0b1220;border:1px solid #1f2a44;">
-            <div style="font-size:12px;opacity:0.7;">{title}</div>
-            <div style="font-size:24px;font-weight:700;color:{color}">{icon} {value}</div>
-        </div>
-        """,
+        _STAT_CARD_HTML.format(title=title, value=value, icon=icon, color=color),
         unsafe_allow_html=True
     )
 
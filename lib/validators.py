@@ -0,0 +1,41 @@
+# lib/validators.py - Shared phone validation used by auth and db
+import re
+
+# Deletes every non-digit ASCII character in one C-level pass
+_KEEP_DIGITS = str.maketrans('', '', ''.join(chr(c) for c in range(128) if not chr(c).isdigit()))
+_NON_DIGIT = re.compile(r'[^\d]')
+
+def _strip_non_digits(phone):
+    digits = phone.translate(_KEEP_DIGITS)
+    # Non-ASCII separators survive the table; fall back to the regex for those
+    return digits if digits.isascii() else _NON_DIGIT.sub('', digits)
+
+def validate_phone(phone):
+    """Validate 10-digit phone number (callers decide whether phone is optional)"""
+    if not phone:
+        return False
+    
+    # Fast path: already plain digits
+    if phone.isdigit():
+        return len(phone) == 10
+    
+    # Remove any spaces, hyphens, parentheses, dots
+    clean_phone = _strip_non_digits(phone)
+    return len(clean_phone) == 10 and clean_phone.isdigit()
+
+def format_phone(phone):
+    """Format phone number as XXX-XXX-XXXX"""
+    if not phone:
+        return phone
+    
+    # Already XXX-XXX-XXXX - nothing to rebuild
+    if len(phone) == 12 and phone[3] == '-' and phone[7] == '-' and phone.replace('-', '').isdigit():
+        return phone
+    
+    clean_phone = phone if phone.isdigit() else _strip_non_digits(phone)
+    
+    # Format as XXX-XXX-XXXX if 10 digits
+    if len(clean_phone) == 10:
+        return f"{clean_phone[:3]}-{clean_phone[3:6]}-{clean_phone[6:]}"
+    
+    return phone
@@ -1,6 +1,7 @@
 # lib/velocity_checks.py - Velocity and pattern detection
 from datetime import datetime, timedelta
-from sqlalchemy import select, and_
+import numpy as np
+from sqlalchemy import select, and_, func, case
 from lib.db import get_engine, transactions, users
 
 class VelocityChecker:
@@ -19,50 +20,43 @@ class VelocityChecker:
         now = datetime.utcnow()
         violations = []
         
+        hour_ago = now - timedelta(hours=1)
+        day_ago = now - timedelta(hours=24)
+        in_last_hour = transactions.c.created_at >= hour_ago
+        
+        # One scan over the last 24h; the 1h figures are conditional aggregates
         with eng.begin() as conn:
-            # Check 1-hour velocity
-            hour_ago = now - timedelta(hours=1)
-            recent_1h = conn.execute(
-                select(transactions.c.amount)
-                .where(and_(
-                    transactions.c.sender_id == user_id,
-                    transactions.c.created_at >= hour_ago,
-                    transactions.c.status.in_(["Success", "Under Review"])
-                ))
-            ).fetchall()
-            
-            amount_1h = sum(tx.amount for tx in recent_1h)
-            count_1h = len(recent_1h)
-            
-            if amount_1h + amount > self.rules["max_amount_1h"]:
-                violations.append(f"1h amount limit exceeded: ${amount_1h + amount:.2f}")
-            
-            if count_1h + 1 > self.rules["max_tx_count_1h"]:
-                violations.append(f"1h transaction count exceeded: {count_1h + 1}")
-            
-            # Check 24-hour velocity
-            day_ago = now - timedelta(hours=24)
-            recent_24h = conn.execute(
-                select(transactions.c.amount, transactions.c.recipient_id)
+            amount_1h, count_1h, amount_24h, count_24h, unique_recipients = conn.execute(
+                select(
+                    func.coalesce(func.sum(case((in_last_hour, transactions.c.amount), else_=0)), 0),
+                    func.count().filter(in_last_hour),
+                    func.coalesce(func.sum(transactions.c.amount), 0),
+                    func.count(),
+                    func.count(func.distinct(transactions.c.recipient_id))
+                )
                 .where(and_(
                     transactions.c.sender_id == user_id,
                     transactions.c.created_at >= day_ago,
                     transactions.c.status.in_(["Success", "Under Review"])
                 ))
-            ).fetchall()
-            
-            amount_24h = sum(tx.amount for tx in recent_24h)
-            count_24h = len(recent_24h)
-            unique_recipients = len(set(tx.recipient_id for tx in recent_24h if tx.recipient_id))
-            
-            if amount_24h + amount > self.rules["max_amount_24h"]:
-                violations.append(f"24h amount limit exceeded: ${amount_24h + amount:.2f}")
-            
-            if count_24h + 1 > self.rules["max_tx_count_24h"]:
-                violations.append(f"24h transaction count exceeded: {count_24h + 1}")
-            
-            if unique_recipients > self.rules["max_unique_recipients_24h"]:
-                violations.append(f"Too many unique recipients: {unique_recipients}")
+            ).one()
+        
+        # Check 1-hour velocity
+        if amount_1h + amount > self.rules["max_amount_1h"]:
+            violations.append(f"1h amount limit exceeded: ${amount_1h + amount:.2f}")
+        
+        if count_1h + 1 > self.rules["max_tx_count_1h"]:
+            violations.append(f"1h transaction count exceeded: {count_1h + 1}")
+        
+        # Check 24-hour velocity
+        if amount_24h + amount > self.rules["max_amount_24h"]:
+            violations.append(f"24h amount limit exceeded: ${amount_24h + amount:.2f}")
+        
+        if count_24h + 1 > self.rules["max_tx_count_24h"]:
+            violations.append(f"24h transaction count exceeded: {count_24h + 1}")
+        
+        if unique_recipients > self.rules["max_unique_recipients_24h"]:
+            violations.append(f"Too many unique recipients: {unique_recipients}")
         
         return violations, {
             "amount_1h": amount_1h,
@@ -73,6 +67,11 @@ class VelocityChecker:
         }
 
 class PatternDetector:
+    # Card testing: this many sub-$10 payments among a user's last 20
+    SMALL_AMOUNT = 10
+    SMALL_WINDOW = 20
+    SMALL_THRESHOLD = 5
+    
     def detect_suspicious_patterns(self, amount, description, recent_transactions):
         """Detect suspicious transaction patterns"""
         patterns = []
@@ -83,11 +82,12 @@ class PatternDetector:
         
         # Sequential amounts
         if recent_transactions:
-            amounts = [tx.amount for tx in recent_transactions[-5:]]
-            if len(amounts) >= 3:
+            last = recent_transactions[-5:]
+            amounts = np.fromiter((tx.amount for tx in last), dtype=np.float64, count=len(last))
+            if amounts.size >= 3:
                 # Check for arithmetic progression
-                diffs = [amounts[i+1] - amounts[i] for i in range(len(amounts)-1)]
-                if len(set(diffs)) == 1 and diffs[0] != 0:
+                diffs = np.diff(amounts)
+                if diffs[0] != 0 and np.all(diffs == diffs[0]):
                     patterns.append("Sequential amounts")
         
         # Repetitive descriptions
@@ -96,9 +96,9 @@ class PatternDetector:
             if descriptions and descriptions.count(description) >= 3:
                 patterns.append("Repetitive description")
         
-        # High frequency small amounts (card testing)
-        small_amounts = [tx for tx in recent_transactions[-20:] if tx.amount < 10]
-        if len(small_amounts) >= 5:
+        # High frequency small amounts (card testing) - count without building a list
+        small_count = sum(1 for tx in recent_transactions[-self.SMALL_WINDOW:] if tx.amount < self.SMALL_AMOUNT)
+        if small_count >= self.SMALL_THRESHOLD:
             patterns.append("Possible card testing")
         
         return patterns
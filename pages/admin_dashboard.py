@@ -1,45 +1,209 @@
 # pages/admin_dashboard.py - Complete enhanced admin interface - ALL NONE ERRORS FIXED
 import streamlit as st
 import pandas as pd
-from sqlalchemy import select, update, insert, desc, and_
+from sqlalchemy import select, update, insert, desc, and_, func, literal, bindparam
 from lib.auth import role_guard
-from lib.db import get_engine, users, transactions, cases, settings, audit_logs
+from lib.db import get_engine, invalidate_user_cache, refresh_risk_bands, users, transactions, cases, settings, audit_logs
+from lib.dbdebug import log_query_count
+from lib.case_queries import clear_case_caches
 
+# Hot statements built once; with the engine's compiled cache each rerun only binds
+# parameters instead of rebuilding and re-hashing the expression tree
+_SYSTEM_SETTINGS_STMT = select(settings).where(settings.c.key == "system")
+
+_PENDING_PAGE_SIZE = 20
+_pending_sender = users.alias("sender")
+_PENDING_PAYMENTS_STMT = (
+    select(
+        transactions,
+        _pending_sender.c.id.label("sender_user_id"),
+        _pending_sender.c.name.label("sender_name"),
+        _pending_sender.c.email.label("sender_email"),
+    )
+    .select_from(transactions.outerjoin(_pending_sender, _pending_sender.c.id == transactions.c.sender_id))
+    .where(transactions.c.status == "Pending Approval")
+    .order_by(desc(transactions.c.id))
+    .limit(_PENDING_PAGE_SIZE)
+)
+_PENDING_PAYMENTS_OLDER_STMT = _PENDING_PAYMENTS_STMT.where(transactions.c.id < bindparam("cursor"))
+
+_RECENT_DECISIONS_STMT = (
+    select(audit_logs.c.action, audit_logs.c.amount, audit_logs.c.created_at, audit_logs.c.actor_user_id)
+    .where(audit_logs.c.action.in_(["approve_payment", "reject_payment", "admin_force_approve", "admin_force_reject"]))
+    .order_by(desc(audit_logs.c.created_at))
+    .limit(10)
+)
+
+# Streamlit reruns the whole page on every widget interaction, so the read-only
+# aggregates below are memoized briefly and cleared by the handlers that change them
+
+@st.cache_data(ttl=30)
+def _fetch_overview_stats():
+    """System statistics for the overview - every count/sum as a scalar subquery in one round-trip"""
+    def count_of(table, *where):
+        return select(func.count()).select_from(table).where(*where).scalar_subquery()
+    
+    with get_engine().connect() as conn:
+        stats = conn.execute(select(
+            count_of(users, users.c.role == "user").label("total_users"),
+            count_of(users, users.c.status == "pending").label("pending_users"),
+            count_of(transactions).label("total_transactions"),
+            count_of(transactions, transactions.c.status.in_(["Flagged", "Under Review"])).label("flagged_transactions"),
+            count_of(transactions, transactions.c.status == "Pending Approval").label("pending_approvals"),
+            count_of(cases, cases.c.status.in_(["Assigned", "In Review"])).label("open_cases"),
+            # System health metrics - FIXED: Handle None values
+            select(func.coalesce(func.sum(users.c.balance), 0)).where(users.c.role == "user").scalar_subquery().label("system_balance"),
+            # Today's transactions - a bound datetime so the created_at index range-scans
+            count_of(transactions, transactions.c.created_at >= pd.Timestamp.now().normalize().to_pydatetime()).label("today_txs"),
+        )).one()
+    return dict(stats._mapping)
+
+@st.cache_data(ttl=10)
+def _fetch_user_accounts():
+    """All end-user accounts ordered by name - only the columns balance management shows"""
+    with get_engine().connect() as conn:
+        return conn.execute(
+            select(users.c.id, users.c.name, users.c.email, users.c.balance, users.c.status)
+            .where(users.c.role == "user")
+            .order_by(users.c.name)
+        ).fetchall()
+
+@st.cache_data(ttl=10)
+def _fetch_balance_totals():
+    """Total, average and highest end-user balance (missing balances count as zero)"""
+    balance = func.coalesce(users.c.balance, 0)
+    with get_engine().connect() as conn:
+        totals = conn.execute(
+            select(
+                func.coalesce(func.sum(balance), 0).label("total"),
+                func.coalesce(func.avg(balance), 0).label("average"),
+                func.coalesce(func.max(balance), 0).label("highest"),
+            ).where(users.c.role == "user")
+        ).one()
+    return dict(totals._mapping)
+
+@st.cache_data(ttl=30)
+def _fetch_case_counts():
+    """(status, finding, count) rows - one GROUP BY covers the status counts and the resolution breakdown"""
+    with get_engine().connect() as conn:
+        return conn.execute(
+            select(cases.c.status, cases.c.finding, func.count())
+            .group_by(cases.c.status, cases.c.finding)
+        ).fetchall()
+
+@st.cache_data(ttl=30)
+def _fetch_pending_payment_summary():
+    """Count, blocked amount, average risk and critical count of payments awaiting approval"""
+    with get_engine().connect() as conn:
+        summary = conn.execute(
+            select(
+                func.count().label("pending_count"),
+                func.coalesce(func.sum(transactions.c.amount), 0).label("blocked_amount"),
+                func.coalesce(func.avg(transactions.c.risk_score), 0).label("avg_risk"),
+                func.count().filter(func.coalesce(transactions.c.risk_score, 0) >= 0.9).label("critical_count"),
+            ).where(transactions.c.status == "Pending Approval")
+        ).one()
+    return dict(summary._mapping)
+
+@st.cache_data(ttl=30)
+def _fetch_cyber_officials():
+    """Approved cyber officials that cases can be assigned to"""
+    with get_engine().connect() as conn:
+        return conn.execute(
+            select(users.c.id, users.c.name, users.c.email)
+            .where(users.c.role == "cyber", users.c.status == "approved")
+        ).fetchall()
+
+@st.cache_data(ttl=60)
+def _fetch_settings():
+    """The system settings dict, empty when it has not been created yet"""
+    with get_engine().connect() as conn:
+        cfg_row = conn.execute(_SYSTEM_SETTINGS_STMT).fetchone()
+    return cfg_row.value if cfg_row else {}
+
+# st.cache_data.clear() would wipe every cached function in the process - the cyber
+# dashboard's and every other session's too - so handlers clear only what they change
+def _clear_account_caches():
+    """Drop the cached reads that show user accounts, statuses and balances"""
+    _fetch_overview_stats.clear()
+    _fetch_user_accounts.clear()
+    _fetch_balance_totals.clear()
+
+def _clear_payment_caches():
+    """Drop the cached reads that count pending payments, including the officials' case views"""
+    _fetch_overview_stats.clear()
+    _fetch_pending_payment_summary.clear()
+    clear_case_caches()
+
+class _PaymentNotFunded(Exception):
+    """Raised inside a transaction block to roll back a force approval that can't be paid"""
+
+class _PaymentNotPending(Exception):
+    """Raised inside a transaction block when the payment was already decided elsewhere"""
+
+def _claim_pending_payment(conn, payment_id, new_status):
+    """Move a payment out of Pending Approval, so only one override can ever apply to it"""
+    claimed = conn.execute(
+        update(transactions)
+        .where(transactions.c.id == payment_id, transactions.c.status == "Pending Approval")
+        .values(status=new_status)
+        .returning(transactions.c.id)
+    ).first()
+    if not claimed:
+        raise _PaymentNotPending()
+
+def _update_with_logs(conn, update_stmt, *inserts):
+    """Run a users UPDATE together with the (table, values) rows that record it.
+    
+    On PostgreSQL this is one writable-CTE statement, so a click costs a single
+    round-trip; the rows are only written when the UPDATE matched. Other backends
+    run the statements in order inside the caller's transaction.
+    """
+    if conn.dialect.name != "postgresql":
+        conn.execute(update_stmt)
+        for table, values in inserts:
+            conn.execute(insert(table).values(**values))
+        return
+    
+    upd = update_stmt.returning(users.c.id).cte("upd")
+    stmts = [
+        insert(table).from_select(
+            list(values),
+            select(*(literal(v, table.c[k].type) for k, v in values.items())).select_from(upd)
+        )
+        for table, values in inserts
+    ]
+    logged = [stmt.returning(table.c.id).cte(f"log_{i}") for i, (stmt, (table, _)) in enumerate(zip(stmts[:-1], inserts))]
+    conn.execute(stmts[-1].add_cte(upd, *logged))
+
+@log_query_count(3)
 def render_admin_overview():
     """Admin Overview Dashboard"""
     st.header("🎯 System Overview")
     
     eng = get_engine()
-    with eng.begin() as conn:
-        # Get system statistics
-        total_users = conn.execute(select(users.c.id).where(users.c.role == "user")).fetchall()
-        pending_users = conn.execute(select(users.c.id).where(users.c.status == "pending")).fetchall()
-        total_transactions = conn.execute(select(transactions.c.id)).fetchall()
-        flagged_transactions = conn.execute(select(transactions.c.id).where(transactions.c.status.in_(["Flagged", "Under Review"]))).fetchall()
-        pending_approvals = conn.execute(select(transactions.c.id).where(transactions.c.status == "Pending Approval")).fetchall()
-        open_cases = conn.execute(select(cases.c.id).where(cases.c.status.in_(["Assigned", "In Review"]))).fetchall()
-        
-        # System health metrics - FIXED: Handle None values
-        total_balance = conn.execute(select(users.c.balance).where(users.c.role == "user")).fetchall()
-        system_balance = sum(float(b.balance) if b.balance is not None else 0.0 for b in total_balance)
-        
-        # Today's transactions
-        today_txs = conn.execute(
-            select(transactions.c.id)
-            .where(transactions.c.created_at >= pd.Timestamp.now().strftime('%Y-%m-%d'))
-        ).fetchall()
+    stats = _fetch_overview_stats()
+    
+    total_users = stats["total_users"]
+    pending_users = stats["pending_users"]
+    total_transactions = stats["total_transactions"]
+    flagged_transactions = stats["flagged_transactions"]
+    pending_approvals = stats["pending_approvals"]
+    open_cases = stats["open_cases"]
+    system_balance = float(stats["system_balance"])
+    today_txs = stats["today_txs"]
     
     # Key Metrics - ENHANCED
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        st.metric("👥 Total Users", len(total_users), f"{len(pending_users)} pending")
+        st.metric("👥 Total Users", total_users, f"{pending_users} pending")
     with col2:
-        st.metric("💳 Total Transactions", len(total_transactions), f"{len(today_txs)} today")
+        st.metric("💳 Total Transactions", total_transactions, f"{today_txs} today")
     with col3:
-        st.metric("🚨 Flagged Transactions", len(flagged_transactions))
+        st.metric("🚨 Flagged Transactions", flagged_transactions)
     with col4:
-        st.metric("⏳ Pending Approvals", len(pending_approvals))
+        st.metric("⏳ Pending Approvals", pending_approvals)
     with col5:
         st.metric("💰 System Balance", f"${system_balance:,.2f}")
     
@@ -52,7 +216,7 @@ def render_admin_overview():
         st.subheader("📊 System Health")
         
         # Calculate health score
-        health_score = 100 - (len(flagged_transactions) * 2) - (len(open_cases) * 3) - (len(pending_approvals) * 1)
+        health_score = 100 - (flagged_transactions * 2) - (open_cases * 3) - (pending_approvals * 1)
         health_score = max(0, min(100, health_score))
         
         if health_score >= 90:
@@ -63,47 +227,40 @@ def render_admin_overview():
             st.error(f"🔴 Needs Attention ({health_score}%)")
         
         # Risk thresholds info
-        with eng.begin() as conn:
-            cfg = conn.execute(select(settings).where(settings.c.key == "system")).fetchone()
-            if cfg:
-                st.info(f"""**Risk Thresholds:**  
-                Flag: {cfg.value.get('flag_threshold', 0.4):.2f}  
-                Block: {cfg.value.get('block_threshold', 0.7):.2f}""")
+        cfg = _fetch_settings()
+        if cfg:
+            st.info(f"""**Risk Thresholds:**  
+            Flag: {cfg.get('flag_threshold', 0.4):.2f}  
+            Block: {cfg.get('block_threshold', 0.7):.2f}""")
     
     with col2:
         st.subheader("📈 Recent Activity")
-        with eng.begin() as conn:
+        with eng.connect() as conn:
             recent_logs = conn.execute(
-                select(audit_logs.c.action, audit_logs.c.created_at, audit_logs.c.details)
+                select(audit_logs.c.action, audit_logs.c.created_at, audit_logs.c.amount)
                 .order_by(desc(audit_logs.c.created_at))
                 .limit(8)
             ).fetchall()
         
         for log in recent_logs:
             action_display = (log.action or "unknown_action").replace('_', ' ').title()
-            # Parse details string to extract amount if present
-            if log.details and isinstance(log.details, str):
-                if '$' in log.details:
-                    try:
-                        parts = log.details.split('$')
-                        if len(parts) > 1:
-                            amount_part = parts[1].split(' ')[0]
-                            action_display += f" (${amount_part})"
-                    except:
-                        pass
+            # Amount is stored with the entry, so the details text never leaves the DB
+            if log.amount is not None:
+                action_display += f" (${log.amount:,.2f})"
             st.write(f"• {action_display}")
     
     # Critical Alerts
-    if len(pending_approvals) > 5 or len(flagged_transactions) > 10:
+    if pending_approvals > 5 or flagged_transactions > 10:
         st.markdown("---")
         st.subheader("🚨 Critical Alerts")
         
-        if len(pending_approvals) > 5:
-            st.error(f"🔴 {len(pending_approvals)} high-risk payments are blocked and awaiting cyber approval!")
+        if pending_approvals > 5:
+            st.error(f"🔴 {pending_approvals} high-risk payments are blocked and awaiting cyber approval!")
         
-        if len(flagged_transactions) > 10:
-            st.warning(f"🟡 {len(flagged_transactions)} transactions are flagged and may need case assignment!")
+        if flagged_transactions > 10:
+            st.warning(f"🟡 {flagged_transactions} transactions are flagged and may need case assignment!")
 
+@log_query_count(1)
 def render_user_management():
     """Enhanced User Management Tab with Role-based Approval"""
     st.header("👥 User Management")
@@ -113,7 +270,7 @@ def render_user_management():
     # Pending Registrations - ENHANCED
     st.subheader("📋 Pending Registrations")
     
-    with eng.begin() as conn:
+    with eng.connect() as conn:
         pending = conn.execute(
             select(users).where(users.c.status == "pending")
             .order_by(users.c.created_at)
@@ -146,6 +303,7 @@ def render_user_management():
 
 def render_pending_user(user, role_display, role_icon, default_balance):
     """Helper function to render pending user approval interface"""
+    eng = get_engine()
     with st.container():
         col1, col2, col3 = st.columns([2, 2, 1])
         
@@ -163,50 +321,50 @@ def render_pending_user(user, role_display, role_icon, default_balance):
             col_a, col_b = st.columns(2)
             with col_a:
                 if st.button("✅", key=f"approve_{user.id}", help="Approve"):
-                    eng = get_engine()
                     with eng.begin() as conn:
-                        conn.execute(update(users).where(users.c.id == user.id).values(
+                        _update_with_logs(conn, update(users).where(users.c.id == user.id).values(
                             status="approved", 
                             balance=default_balance
-                        ))
-                        conn.execute(insert(audit_logs).values(
+                        ), (audit_logs, dict(
                             actor_user_id=st.session_state["user_id"], 
                             action="approve_user", 
                             entity_type="user", 
                             entity_id=user.id, 
-                            details=f"Approved {role_display.lower()}: {user.email} with balance ${default_balance}"
-                        ))
+                            details=f"Approved {role_display.lower()}: {user.email} with balance ${default_balance}",
+                            amount=default_balance
+                        )))
+                    invalidate_user_cache(user.email)
+                    _clear_account_caches()
+                    _fetch_cyber_officials.clear()
                     st.success(f"✅ {role_display} {user.email} approved!")
                     st.rerun()
             
             with col_b:
                 if st.button("❌", key=f"reject_{user.id}", help="Reject"):
-                    eng = get_engine()
                     with eng.begin() as conn:
-                        conn.execute(update(users).where(users.c.id == user.id).values(status="rejected"))
-                        conn.execute(insert(audit_logs).values(
+                        _update_with_logs(conn, update(users).where(users.c.id == user.id).values(status="rejected"), (audit_logs, dict(
                             actor_user_id=st.session_state["user_id"], 
                             action="reject_user", 
                             entity_type="user", 
                             entity_id=user.id, 
                             details=f"Rejected {role_display.lower()} registration: {user.email}"
-                        ))
+                        )))
+                    invalidate_user_cache(user.email)
+                    _clear_account_caches()
+                    _fetch_cyber_officials.clear()
                     st.warning(f"❌ {role_display} {user.email} rejected!")
                     st.rerun()
         
         st.markdown("---")
 
 
+@log_query_count(3)
 def render_balance_management():
     """Balance Management Tab"""
     st.header("💰 Balance Management")
     
     eng = get_engine()
-    with eng.begin() as conn:
-        user_accounts = conn.execute(
-            select(users).where(users.c.role == "user")
-            .order_by(users.c.name)
-        ).fetchall()
+    user_accounts = _fetch_user_accounts()
     
     if not user_accounts:
         st.warning("No user accounts found.")
@@ -217,14 +375,18 @@ def render_balance_management():
     
     col1, col2 = st.columns(2)
     
+    # id -> account and id -> label, built once so option formatting is a dict lookup
+    accounts_by_id = {u.id: u for u in user_accounts}
+    account_labels = {uid: f"{u.name or 'Unknown'} ({u.email}) - ${float(u.balance or 0):,.2f}" for uid, u in accounts_by_id.items()}
+    
     with col1:
         selected_user_id = st.selectbox(
             "Select User", 
-            [u.id for u in user_accounts],
-            format_func=lambda x: next(f"{u.name or 'Unknown'} ({u.email}) - ${float(u.balance or 0):,.2f}" for u in user_accounts if u.id == x)
+            list(accounts_by_id),
+            format_func=account_labels.get
         )
         
-        selected_user = next(u for u in user_accounts if u.id == selected_user_id)
+        selected_user = accounts_by_id[selected_user_id]
         
         adjustment_type = st.selectbox("Adjustment Type", ["Add Funds", "Deduct Funds", "Set Balance"])
         amount = st.number_input("Amount ($)", min_value=0.01, value=100.0, step=0.01)
@@ -248,7 +410,7 @@ def render_balance_management():
         st.write(f"**New Balance:** ${new_balance:,.2f}")
         
         # Show recent balance history
-        with eng.begin() as conn:
+        with eng.connect() as conn:
             recent_adjustments = conn.execute(
                 select(transactions)
                 .where(and_(
@@ -266,10 +428,8 @@ def render_balance_management():
     
     if st.button("💾 Apply Adjustment", type="primary"):
         with eng.begin() as conn:
-            conn.execute(update(users).where(users.c.id == selected_user_id).values(balance=new_balance))
-            
-            # Log adjustment as transaction
-            conn.execute(transactions.insert().values(
+            # Log adjustment as transaction, plus the audit entry
+            _update_with_logs(conn, update(users).where(users.c.id == selected_user_id).values(balance=new_balance), (transactions, dict(
                 sender_id=st.session_state["user_id"] if adjustment_type == "Add Funds" else selected_user_id,
                 recipient_id=selected_user_id if adjustment_type == "Add Funds" else None,
                 transaction_type="admin_adjustment",
@@ -277,16 +437,16 @@ def render_balance_management():
                 description=f"{adjustment_type}: {reason}",
                 status="Success",
                 details={"admin_id": st.session_state["user_id"], "type": adjustment_type, "reason": reason}
-            ))
-            
-            conn.execute(insert(audit_logs).values(
+            )), (audit_logs, dict(
                 actor_user_id=st.session_state["user_id"],
                 action="balance_adjustment",
                 entity_type="user",
                 entity_id=selected_user_id,
-                details=f"Balance {adjustment_type}: ${amount} for {selected_user.email} - New balance: ${new_balance} - Reason: {reason}"
-            ))
+                details=f"Balance {adjustment_type}: ${amount} for {selected_user.email} - New balance: ${new_balance} - Reason: {reason}",
+                amount=amount
+            )))
         
+        _clear_account_caches()
         st.success(f"✅ Balance updated! New balance: ${new_balance:,.2f}")
         st.rerun()
     
@@ -295,47 +455,38 @@ def render_balance_management():
     # Balance Overview
     st.subheader("📊 Balance Overview")
     
-    balance_data = []
-    total_system_balance = 0
-    
-    for user in user_accounts:
-        user_balance = float(user.balance or 0)  # FIXED: Handle None balance
-        balance_data.append({
-            "User": user.name or "No Name",
-            "Email": user.email or "No Email",
-            "Balance": user_balance,
-            "Status": str(user.status or "Unknown").title()  # FIXED: Handle None status
-        })
-        total_system_balance += user_balance  # FIXED: Now safe from None
-    
-    balance_df = pd.DataFrame(balance_data)
-    st.dataframe(balance_df, use_container_width=True)
+    with st.expander("👥 Per-user balances"):
+        # Build the frame column-wise from the cached rows, then fill gaps vectorized
+        balance_df = pd.DataFrame.from_records(
+            user_accounts, columns=["id", "User", "Email", "Balance", "Status"]
+        ).drop(columns="id")
+        balance_df["User"] = balance_df["User"].fillna("No Name")
+        balance_df["Email"] = balance_df["Email"].fillna("No Email")
+        balance_df["Balance"] = balance_df["Balance"].fillna(0).astype(float)  # FIXED: Handle None balance
+        balance_df["Status"] = balance_df["Status"].fillna("Unknown").astype(str).str.title()  # FIXED: Handle None status
+        st.dataframe(balance_df, use_container_width=True)
     
-    # System balance metrics - FIXED: Handle None values
+    # System balance metrics, aggregated in SQL
+    totals = _fetch_balance_totals()
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("💰 Total System Balance", f"${total_system_balance:,.2f}")
+        st.metric("💰 Total System Balance", f"${float(totals['total']):,.2f}")
     with col2:
-        avg_balance = total_system_balance / len(user_accounts) if user_accounts else 0
-        st.metric("📊 Average Balance", f"${avg_balance:,.2f}")
+        st.metric("📊 Average Balance", f"${float(totals['average']):,.2f}")
     with col3:
-        max_balance = max(float(user.balance or 0) for user in user_accounts) if user_accounts else 0  # FIXED: Handle None
-        st.metric("📈 Highest Balance", f"${max_balance:,.2f}")
+        st.metric("📈 Highest Balance", f"${float(totals['highest']):,.2f}")
 
+@log_query_count(12)
 def render_transaction_monitoring():
     """Transaction Monitoring Tab with dynamic priority colors"""
     st.header("📊 Transaction Monitoring")
     
     eng = get_engine()
     
-    # Get system configuration for thresholds
-    with eng.begin() as conn:
-        sys_cfg_row = conn.execute(select(settings).where(settings.c.key == "system")).fetchone()
-        sys_cfg = sys_cfg_row.value if sys_cfg_row else {}
-        
-        # Get admin-configured thresholds
-        flag_threshold = sys_cfg.get("flag_threshold", 0.4)
-        block_threshold = sys_cfg.get("block_threshold", 0.7)
+    # Get admin-configured thresholds
+    sys_cfg = _fetch_settings()
+    flag_threshold = sys_cfg.get("flag_threshold", 0.4)
+    block_threshold = sys_cfg.get("block_threshold", 0.7)
     
     # Enhanced filter controls
     col1, col2, col3, col4 = st.columns(4)
@@ -358,149 +509,181 @@ def render_transaction_monitoring():
     with col4:
         limit = st.selectbox("Records", [50, 100, 200, 500])
     
+    # Keyset cursor: id of the last row on the previous page, reset whenever the filters change
+    filter_key = (status_filter, tx_type_filter, risk_filter, limit)
+    if st.session_state.get("tx_monitor_filters") != filter_key:
+        st.session_state["tx_monitor_filters"] = filter_key
+        st.session_state["tx_monitor_cursor"] = None
+    cursor = st.session_state.get("tx_monitor_cursor")
+    
+    if cursor and st.button("⏮️ Back to newest", key="tx_monitor_newest"):
+        st.session_state["tx_monitor_cursor"] = None
+        st.rerun()
+    
+    # Statistics are filled in above the list once the rows have streamed past
+    stats_slot = st.container()
+    shown = high_risk_count = success_count = risk_count = 0
+    total_amount = risk_sum = 0.0
+    last_id = None
+    
     # Get transactions with filters
-    with eng.begin() as conn:
-        query = select(transactions).order_by(desc(transactions.c.created_at)).limit(limit)
+    with eng.connect() as conn:
+        # Ids follow insertion time, and unlike created_at they compare reliably as a cursor
+        query = select(transactions).order_by(desc(transactions.c.id)).limit(limit)
         
         if status_filter != "All":
             query = query.where(transactions.c.status == status_filter)
         if tx_type_filter != "All":
             query = query.where(transactions.c.transaction_type == tx_type_filter)
         
-        txs = conn.execute(query).fetchall()
-    
-    # Apply dynamic risk filter based on admin thresholds
-    if risk_filter != "All":
-        if f"Low (< {flag_threshold})" in risk_filter:
-            txs = [tx for tx in txs if (tx.risk_score or 0) < flag_threshold]
-        elif f"Medium ({flag_threshold} - {block_threshold})" in risk_filter:
-            txs = [tx for tx in txs if flag_threshold <= (tx.risk_score or 0) < block_threshold]
-        elif f"High (≥ {block_threshold})" in risk_filter:
-            txs = [tx for tx in txs if (tx.risk_score or 0) >= block_threshold]
-    
-    if txs:
-        # Transaction statistics - FIXED: Handle None values
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            total_amount = sum(tx.amount or 0 for tx in txs)
-            st.metric("💰 Total Amount", f"${total_amount:,.2f}")
-        with col2:
-            valid_risk_scores = [tx.risk_score for tx in txs if tx.risk_score is not None]
-            avg_risk = sum(valid_risk_scores) / len(valid_risk_scores) if valid_risk_scores else 0
-            st.metric("⚠️ Avg Risk Score", f"{avg_risk:.3f}")
-        with col3:
-            high_risk_count = len([tx for tx in txs if (tx.risk_score or 0) >= block_threshold])
-            st.metric("🔴 High Risk Count", high_risk_count)
-        with col4:
-            success_count = len([tx for tx in txs if tx.status == "Success"])
-            success_rate = success_count / len(txs) * 100 if txs else 0
-            st.metric("✅ Success Rate", f"{success_rate:.1f}%")
+        # Risk bands are stored against the admin thresholds, so the filter is an indexed equality
+        if risk_filter.startswith("Low"):
+            query = query.where(transactions.c.risk_band == 0)
+        elif risk_filter.startswith("Medium"):
+            query = query.where(transactions.c.risk_band == 1)
+        elif risk_filter.startswith("High"):
+            query = query.where(transactions.c.risk_band == 2)
         
-        st.markdown("---")
+        if cursor:
+            query = query.where(transactions.c.id < cursor)
         
-        # Enhanced transaction display with dynamic priority colors
-        for tx in txs:
-            # Determine priority based on ADMIN-SET thresholds - FIXED: Handle None risk_score
-            risk_score = tx.risk_score or 0
+        # Stream the page in batches instead of buffering every row (details JSON included);
+        # each batch resolves its senders/recipients with one IN-query
+        result = conn.execute(query.execution_options(stream_results=True, yield_per=50))
+        for batch in result.partitions():
+            ids = {tx.sender_id for tx in batch if tx.sender_id} | {tx.recipient_id for tx in batch if tx.recipient_id}
+            user_rows = conn.execute(
+                select(users.c.id, users.c.name, users.c.email).where(users.c.id.in_(ids))
+            ).fetchall() if ids else []
+            user_map = {r.id: r for r in user_rows}
             
-            if risk_score >= block_threshold:
-                priority_icon = "🔴"
-                priority_text = "High Risk"
-                priority_color = "#dc3545"
-                priority_bg = "#dc354522"
-            elif risk_score >= flag_threshold:
-                priority_icon = "🟡"
-                priority_text = "Medium Risk"
-                priority_color = "#ffc107"
-                priority_bg = "#ffc10722"
-            else:
-                priority_icon = "🟢"
-                priority_text = "Low Risk"
-                priority_color = "#28a745"
-                priority_bg = "#28a74522"
-            
-            with st.container():
-                # Display transaction with priority styling
-                st.markdown(f"""
-                <div style='padding: 10px; border-left: 4px solid {priority_color}; background: {priority_bg}; margin-bottom: 10px; border-radius: 5px;'>
-                    <h4 style='color: {priority_color}; margin: 0;'>{priority_icon} {priority_text} - TX #{tx.id}</h4>
-                </div>
-                """, unsafe_allow_html=True)
+            # Enhanced transaction display with dynamic priority colors
+            for tx in batch:
+                # Running totals for the statistics row, gathered in the same pass
+                shown += 1
+                last_id = tx.id
+                total_amount += tx.amount or 0
+                if tx.risk_score is not None:
+                    risk_sum += tx.risk_score
+                    risk_count += 1
+                high_risk_count += tx.risk_band == 2
+                success_count += tx.status == "Success"
+                    
+                # Priority comes from the stored band (ADMIN-SET thresholds) - FIXED: Handle None risk_score
+                risk_score = tx.risk_score or 0
                 
-                col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+                if tx.risk_band == 2:
+                    priority_icon = "🔴"
+                    priority_text = "High Risk"
+                    priority_color = "#dc3545"
+                    priority_bg = "#dc354522"
+                elif tx.risk_band == 1:
+                    priority_icon = "🟡"
+                    priority_text = "Medium Risk"
+                    priority_color = "#ffc107"
+                    priority_bg = "#ffc10722"
+                else:
+                    priority_icon = "🟢"
+                    priority_text = "Low Risk"
+                    priority_color = "#28a745"
+                    priority_bg = "#28a74522"
                 
-                with col1:
-                    # Get user names - FIXED: Handle None values
-                    with eng.begin() as conn:
+                with st.container():
+                    # Display transaction with priority styling
+                    st.markdown(f"""
+                    <div style='padding: 10px; border-left: 4px solid {priority_color}; background: {priority_bg}; margin-bottom: 10px; border-radius: 5px;'>
+                        <h4 style='color: {priority_color}; margin: 0;'>{priority_icon} {priority_text} - TX #{tx.id}</h4>
+                    </div>
+                    """, unsafe_allow_html=True)
+                    
+                    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+                    
+                    with col1:
+                        # Get user names - FIXED: Handle None values
                         if tx.sender_id:
-                            sender = conn.execute(
-                                select(users.c.name, users.c.email)
-                                .where(users.c.id == tx.sender_id)
-                            ).fetchone()
+                            sender = user_map.get(tx.sender_id)
                             sender_name = f"{sender.name or 'Unknown'} ({sender.email})" if sender else f"User {tx.sender_id}"
                         else:
                             sender_name = "System"
                         
                         if tx.recipient_id:
-                            recipient = conn.execute(
-                                select(users.c.name, users.c.email)
-                                .where(users.c.id == tx.recipient_id)
-                            ).fetchone()
+                            recipient = user_map.get(tx.recipient_id)
                             recipient_name = f"{recipient.name or 'Unknown'} ({recipient.email})" if recipient else f"User {tx.recipient_id}"
                         else:
                             recipient_name = "System"
+                        
+                        st.write(f"**TX #{tx.id}** - {(tx.transaction_type or 'unknown').title()}")
+                        st.write(f"**From:** {sender_name}")
+                        st.write(f"**To:** {recipient_name}")
                     
-                    st.write(f"**TX #{tx.id}** - {(tx.transaction_type or 'unknown').title()}")
-                    st.write(f"**From:** {sender_name}")
-                    st.write(f"**To:** {recipient_name}")
-                
-                with col2:
-                    st.write(f"**${tx.amount or 0:,.2f}**")
-                    st.markdown(f"<span style='color: {priority_color}; font-weight: bold;'>Risk: {risk_score:.3f}</span>", unsafe_allow_html=True)
-                
-                with col3:
-                    # Status with color coding
-                    status_colors = {
-                        "Success": "🟢",
-                        "Flagged": "🟡", 
-                        "Under Review": "🟡",
-                        "Blocked": "🔴",
-                        "Pending Approval": "🔴",
-                        "Rejected": "❌"
-                    }
-                    status_icon = status_colors.get(tx.status, "📋")
-                    st.write(f"{status_icon} {tx.status or 'Unknown'}")
-                
-                with col4:
-                    if tx.created_at:
-                        st.write(tx.created_at.strftime("%m/%d/%Y"))
-                        st.write(tx.created_at.strftime("%I:%M %p"))
-                    else:
-                        st.write("Unknown date")
-                
-                # Enhanced details expandable section
-                if tx.details and isinstance(tx.details, dict):
-                    risk_factors = tx.details.get("risk_factors", [])
-                    if risk_factors:
-                        with st.expander("🔍 Risk Analysis"):
-                            cola, colb = st.columns(2)
-                            
-                            with cola:
-                                st.write("**Risk Factors:**")
-                                for factor in risk_factors[:5]:
-                                    st.write(f"• {factor}")
-                            
-                            with colb:
-                                st.write("**Technical Details:**")
-                                st.write(f"• **IP:** {tx.ip or 'Unknown'}")
-                                st.write(f"• **Device:** {(tx.device or 'Unknown')[:30]}...")
-                                st.write(f"• **Location:** {tx.location or 'Unknown'}")
+                    with col2:
+                        st.write(f"**${tx.amount or 0:,.2f}**")
+                        st.markdown(f"<span style='color: {priority_color}; font-weight: bold;'>Risk: {risk_score:.3f}</span>", unsafe_allow_html=True)
+                    
+                    with col3:
+                        # Status with color coding
+                        status_colors = {
+                            "Success": "🟢",
+                            "Flagged": "🟡", 
+                            "Under Review": "🟡",
+                            "Blocked": "🔴",
+                            "Pending Approval": "🔴",
+                            "Rejected": "❌"
+                        }
+                        status_icon = status_colors.get(tx.status, "📋")
+                        st.write(f"{status_icon} {tx.status or 'Unknown'}")
+                    
+                    with col4:
+                        if tx.created_at:
+                            st.write(tx.created_at.strftime("%m/%d/%Y"))
+                            st.write(tx.created_at.strftime("%I:%M %p"))
+                        else:
+                            st.write("Unknown date")
+                    
+                    # Enhanced details expandable section
+                    if tx.details and isinstance(tx.details, dict):
+                        risk_factors = tx.details.get("risk_factors", [])
+                        if risk_factors:
+                            with st.expander("🔍 Risk Analysis"):
+                                cola, colb = st.columns(2)
                                 
-                                if tx.details.get("velocity_violations"):
-                                    st.write(f"• **Velocity Issues:** {len(tx.details['velocity_violations'])}")
-                
-                st.markdown("---")
+                                with cola:
+                                    st.write("**Risk Factors:**")
+                                    for factor in risk_factors[:5]:
+                                        st.write(f"• {factor}")
+                                
+                                with colb:
+                                    st.write("**Technical Details:**")
+                                    st.write(f"• **IP:** {tx.ip or 'Unknown'}")
+                                    st.write(f"• **Device:** {(tx.device or 'Unknown')[:30]}...")
+                                    st.write(f"• **Location:** {tx.location or 'Unknown'}")
+                                    
+                                    if tx.details.get("velocity_violations"):
+                                        st.write(f"• **Velocity Issues:** {len(tx.details['velocity_violations'])}")
+                    
+                    st.markdown("---")
+    
+    if shown:
+        # Transaction statistics - FIXED: Handle None values
+        with stats_slot:
+            col1, col2, col3, col4 = st.columns(4)
+            
+            with col1:
+                st.metric("💰 Total Amount", f"${total_amount:,.2f}")
+            with col2:
+                avg_risk = risk_sum / risk_count if risk_count else 0
+                st.metric("⚠️ Avg Risk Score", f"{avg_risk:.3f}")
+            with col3:
+                st.metric("🔴 High Risk Count", high_risk_count)
+            with col4:
+                success_rate = success_count / shown * 100
+                st.metric("✅ Success Rate", f"{success_rate:.1f}%")
+            
+            st.markdown("---")
+        
+        if shown == limit and st.button("Older ➡️", key="tx_monitor_older"):
+            st.session_state["tx_monitor_cursor"] = last_id
+            st.rerun()
     else:
         st.info("📭 No transactions match the selected filters.")
         
@@ -522,6 +705,7 @@ def render_transaction_monitoring():
             st.markdown(f"🟡 **Medium Risk:** {flag_threshold} - {block_threshold}")
             st.markdown(f"🔴 **High Risk:** Above {block_threshold}")
 
+@log_query_count(4)
 def render_case_management():
     """Case Management Tab"""
     st.header("🕵️ Case Management")
@@ -531,16 +715,31 @@ def render_case_management():
     # Open Cases
     st.subheader("📋 Unassigned Cases")
     
-    with eng.begin() as conn:
+    with eng.connect() as conn:
+        # Project only what the case cards show - the transaction details JSON stays in the DB
         open_cases = conn.execute(
-            select(cases, transactions)
-            .join(transactions, cases.c.transaction_id == transactions.c.id)
+            select(
+                cases.c.id.label("case_id"),
+                cases.c.created_at.label("case_created"),
+                transactions.c.id.label("tx_id"),
+                transactions.c.amount,
+                transactions.c.risk_score,
+                transactions.c.risk_band,
+                transactions.c.status.label("tx_status"),
+            )
+            .join_from(cases, transactions, cases.c.transaction_id == transactions.c.id)
             .where(cases.c.status == "Assigned", cases.c.assigned_to.is_(None))
         ).fetchall()
-        
-        cyber_officials = conn.execute(
-            select(users).where(users.c.role == "cyber", users.c.status == "approved")
-        ).fetchall()
+    
+    # Assignee name -> id, built once for the bulk selector and every case card
+    cyber_officials = _fetch_cyber_officials()
+    cyber_options = {f"{c.name or c.email}": c.id for c in cyber_officials}
+    cyber_names = list(cyber_options)
+    
+    # Thresholds don't change during a render - read them once for every case
+    sys_cfg = _fetch_settings()
+    flag_threshold = sys_cfg.get("flag_threshold", 0.4)
+    block_threshold = sys_cfg.get("block_threshold", 0.7)
     
     if open_cases:
         # Bulk assignment feature
@@ -550,27 +749,30 @@ def render_case_management():
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                cyber_options = {f"{c.name or c.email}": c.id for c in cyber_officials}
-                bulk_assignee = st.selectbox("Assign All Cases To", list(cyber_options.keys()))
+                bulk_assignee = st.selectbox("Assign All Cases To", cyber_names)
             
             with col2:
                 if st.button("📋 Assign All Cases", type="primary"):
                     cyber_id = cyber_options[bulk_assignee]
+                    case_ids = [case.case_id for case in open_cases]
                     with eng.begin() as conn:
-                        for case in open_cases:
-                            conn.execute(
-                                update(cases)
-                                .where(cases.c.id == case.cases_id)
-                                .values(assigned_to=cyber_id, status="In Review")
-                            )
-                            conn.execute(insert(audit_logs).values(
-                                actor_user_id=st.session_state["user_id"],
-                                action="assign_case",
-                                entity_type="case",
-                                entity_id=case.cases_id,
-                                details=f"Bulk assigned case #{case.cases_id} to {bulk_assignee}"
-                            ))
+                        # One UPDATE for every case and one multi-row audit insert
+                        conn.execute(
+                            update(cases)
+                            .where(cases.c.id.in_(case_ids))
+                            .values(assigned_to=cyber_id, status="In Review")
+                        )
+                        conn.execute(insert(audit_logs), [{
+                            "actor_user_id": st.session_state["user_id"],
+                            "action": "assign_case",
+                            "entity_type": "case",
+                            "entity_id": case_id,
+                            "details": f"Bulk assigned case #{case_id} to {bulk_assignee}"
+                        } for case_id in case_ids])
                     
+                    _fetch_case_counts.clear()
+                    _fetch_overview_stats.clear()
+                    clear_case_caches()
                     st.success(f"✅ All {len(open_cases)} cases assigned to {bulk_assignee}")
                     st.rerun()
             
@@ -581,25 +783,16 @@ def render_case_management():
         
         # Individual case assignment
         for case in open_cases:
-            # GET DYNAMIC THRESHOLDS FROM SETTINGS
-            with eng.begin() as conn:
-                sys_cfg_row = conn.execute(select(settings).where(settings.c.key == "system")).fetchone()
-                sys_cfg = sys_cfg_row.value if sys_cfg_row else {}
-                
-                # Get admin-configured thresholds
-                flag_threshold = sys_cfg.get("flag_threshold", 0.4)
-                block_threshold = sys_cfg.get("block_threshold", 0.7)
-            
-            # Determine priority based on ADMIN-SET thresholds - FIXED: Handle None risk_score
-            risk_score = case.transactions_risk_score or 0
+            # Priority comes from the stored band (ADMIN-SET thresholds) - FIXED: Handle None risk_score
+            risk_score = case.risk_score or 0
             
-            if risk_score >= block_threshold:
+            if case.risk_band == 2:
                 priority_icon = "🔴"
                 priority_text = "High Priority"
                 priority_color = "#dc3545"
                 priority_bg = "#dc354522"
                 threshold_desc = f"Above Block Threshold ({block_threshold})"
-            elif risk_score >= flag_threshold:
+            elif case.risk_band == 1:
                 priority_icon = "🟡"
                 priority_text = "Medium Priority"
                 priority_color = "#ffc107"
@@ -616,16 +809,16 @@ def render_case_management():
                 # Display case with proper priority styling
                 st.markdown(f"""
                 <div style='padding: 10px; border-left: 4px solid {priority_color}; background: {priority_bg}; margin-bottom: 10px; border-radius: 5px;'>
-                    <h4 style='color: {priority_color}; margin: 0;'>{priority_icon} {priority_text} - Case #{case.cases_id}</h4>
+                    <h4 style='color: {priority_color}; margin: 0;'>{priority_icon} {priority_text} - Case #{case.case_id}</h4>
                 </div>
                 """, unsafe_allow_html=True)
                 
                 col1, col2, col3 = st.columns([2, 1, 1])
                 with col1:
-                    st.write(f"**Transaction:** ${case.transactions_amount or 0:.2f}")
+                    st.write(f"**Transaction:** ${case.amount or 0:.2f}")
                     st.write(f"**Risk Score:** {risk_score:.3f}")
-                    st.write(f"**Status:** {case.transactions_status or 'Unknown'}")
-                    st.write(f"**Created:** {case.cases_created_at.strftime('%Y-%m-%d %H:%M') if case.cases_created_at else 'Unknown'}")
+                    st.write(f"**Status:** {case.tx_status or 'Unknown'}")
+                    st.write(f"**Created:** {case.case_created.strftime('%Y-%m-%d %H:%M') if case.case_created else 'Unknown'}")
                 
                 with col2:
                     # Show priority with colored text and dynamic thresholds
@@ -636,29 +829,31 @@ def render_case_management():
                     st.caption(f"Flag: {flag_threshold} | Block: {block_threshold}")
                     
                     if cyber_officials:
-                        cyber_options = {f"{c.name or c.email}": c.id for c in cyber_officials}
                         selected_cyber = st.selectbox(
                             "Assign to", 
-                            list(cyber_options.keys()), 
-                            key=f"assign_{case.cases_id}"
+                            cyber_names, 
+                            key=f"assign_{case.case_id}"
                         )
                 
                 with col3:
-                    if cyber_officials and st.button("📋 Assign", key=f"btn_assign_{case.cases_id}"):
+                    if cyber_officials and st.button("📋 Assign", key=f"btn_assign_{case.case_id}"):
                         cyber_id = cyber_options[selected_cyber]
                         with eng.begin() as conn:
                             conn.execute(
                                 update(cases)
-                                .where(cases.c.id == case.cases_id)
+                                .where(cases.c.id == case.case_id)
                                 .values(assigned_to=cyber_id, status="In Review")
                             )
                             conn.execute(insert(audit_logs).values(
                                 actor_user_id=st.session_state["user_id"],
                                 action="assign_case",
                                 entity_type="case",
-                                entity_id=case.cases_id,
-                                details=f"Assigned case #{case.cases_id} to {selected_cyber}"
+                                entity_id=case.case_id,
+                                details=f"Assigned case #{case.case_id} to {selected_cyber}"
                             ))
+                        _fetch_case_counts.clear()
+                        _fetch_overview_stats.clear()
+                        clear_case_caches()
                         st.success(f"Case assigned to {selected_cyber}")
                         st.rerun()
                 
@@ -672,35 +867,39 @@ def render_case_management():
     # Case Statistics
     st.subheader("📊 Case Statistics")
     
-    with eng.begin() as conn:
-        all_cases = conn.execute(select(cases)).fetchall()
-        resolved_cases = [c for c in all_cases if c.status == "Resolved"]
-        in_review_cases = [c for c in all_cases if c.status == "In Review"]
-        
-        # Get resolution breakdown
-        fraud_detected = len([c for c in resolved_cases if c.finding == "Fraudulent"])
-        false_positives = len([c for c in resolved_cases if c.finding == "Safe"])
+    status_counts = {}
+    finding_counts = {}
+    for status, finding, count in _fetch_case_counts():
+        status_counts[status] = status_counts.get(status, 0) + count
+        if status == "Resolved":
+            finding_counts[finding] = finding_counts.get(finding, 0) + count
+    
+    total_cases = sum(status_counts.values())
+    resolved = status_counts.get("Resolved", 0)
+    
+    # Get resolution breakdown
+    fraud_detected = finding_counts.get("Fraudulent", 0)
+    false_positives = finding_counts.get("Safe", 0)
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("📋 Total Cases", len(all_cases))
+        st.metric("📋 Total Cases", total_cases)
     with col2:
-        st.metric("🔍 In Review", len(in_review_cases))
+        st.metric("🔍 In Review", status_counts.get("In Review", 0))
     with col3:
-        st.metric("✅ Resolved", len(resolved_cases))
+        st.metric("✅ Resolved", resolved)
     with col4:
-        detection_rate = fraud_detected / len(resolved_cases) * 100 if resolved_cases else 0
+        detection_rate = fraud_detected / resolved * 100 if resolved else 0
         st.metric("🎯 Fraud Detection Rate", f"{detection_rate:.1f}%")
 
+@log_query_count(1)
 def render_system_settings():
     """System Settings Tab"""
     st.header("⚙️ System Settings")
     
     eng = get_engine()
-    with eng.begin() as conn:
-        cfg_row = conn.execute(select(settings).where(settings.c.key == "system")).fetchone()
-        cfg = cfg_row.value if cfg_row else {}
+    cfg = _fetch_settings()
     
     st.subheader("🛡️ Fraud Detection Configuration")
     
@@ -747,14 +946,18 @@ def render_system_settings():
             
             with eng.begin() as conn:
                 conn.execute(update(settings).where(settings.c.key == "system").values(value=new_cfg))
+                if (flag_threshold, block_threshold) != (cfg.get("flag_threshold", 0.4), cfg.get("block_threshold", 0.7)):
+                    refresh_risk_bands(conn, flag_threshold, block_threshold)
                 conn.execute(insert(audit_logs).values(
                     actor_user_id=st.session_state["user_id"],
                     action="update_settings",
                     entity_type="settings",
                     entity_id=0,
-                    details=f"Updated system settings - Flag: {flag_threshold}, Block: {block_threshold}, Tx Limit: ${tx_limit}"
+                    details=f"Updated system settings - Flag: {flag_threshold}, Block: {block_threshold}, Tx Limit: ${tx_limit}",
+                    amount=tx_limit
                 ))
             
+            _fetch_settings.clear()
             st.success("✅ Settings saved successfully!")
             st.rerun()
     
@@ -781,6 +984,7 @@ def render_system_settings():
         • Unusual Locations: {len(cfg.get('unusual_locations', []))} defined
         """)
 
+@log_query_count(3)
 def render_payment_monitoring():
     """Payment Monitoring Tab - NEW"""
     st.header("⏳ Payment Monitoring")
@@ -790,169 +994,203 @@ def render_payment_monitoring():
     # Pending Approvals Overview
     st.subheader("🚫 Blocked Payments (Pending Approval)")
     
-    with eng.begin() as conn:
-        pending_payments = conn.execute(
-            select(transactions)
-            .where(transactions.c.status == "Pending Approval")
-            .order_by(desc(transactions.c.created_at))
-        ).fetchall()
+    # Outcome of an override from the previous run, carried across its st.rerun()
+    flash = st.session_state.pop("payment_flash", None)
+    if flash:
+        level, message = flash
+        getattr(st, level)(message)
+    
+    # Render one page of expanders at a time, keyset-paged by id like transaction monitoring
+    page_size = _PENDING_PAGE_SIZE
+    cursor = st.session_state.get("pending_payments_cursor")
+    if cursor and st.button("⏮️ Back to newest", key="pending_payments_newest"):
+        st.session_state["pending_payments_cursor"] = None
+        st.rerun()
+    
+    # Sender details come joined in, instead of one lookup per expander
+    with eng.connect() as conn:
+        if cursor:
+            pending_payments = conn.execute(_PENDING_PAYMENTS_OLDER_STMT, {"cursor": cursor}).fetchall()
+        else:
+            pending_payments = conn.execute(_PENDING_PAYMENTS_STMT).fetchall()
     
     if pending_payments:
-        # Summary metrics - FIXED: Handle None values
+        # Summary metrics, aggregated in SQL and cached between reruns
+        summary = _fetch_pending_payment_summary()
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("⏳ Pending Count", len(pending_payments))
+            st.metric("⏳ Pending Count", summary["pending_count"])
         
         with col2:
-            total_blocked_amount = sum(p.amount or 0 for p in pending_payments)
-            st.metric("💰 Total Blocked Amount", f"${total_blocked_amount:,.2f}")
+            st.metric("💰 Total Blocked Amount", f"${float(summary['blocked_amount']):,.2f}")
         
         with col3:
-            valid_risk_scores = [p.risk_score for p in pending_payments if p.risk_score is not None]
-            avg_risk = sum(valid_risk_scores) / len(valid_risk_scores) if valid_risk_scores else 0
-            st.metric("⚠️ Avg Risk Score", f"{avg_risk:.3f}")
+            st.metric("⚠️ Avg Risk Score", f"{float(summary['avg_risk']):.3f}")
         
         with col4:
-            critical_count = len([p for p in pending_payments if (p.risk_score or 0) >= 0.9])
-            st.metric("🚨 Critical Risk", critical_count)
+            st.metric("🚨 Critical Risk", summary["critical_count"])
         
         st.markdown("---")
+        st.caption(f"Showing {len(pending_payments)} of {summary['pending_count']} pending payments, newest first")
         
-        # Detailed pending payments view
-        for payment in pending_payments:
-            with st.expander(f"Payment #{payment.id} - ${payment.amount or 0:.2f} (Risk: {payment.risk_score or 0:.3f})"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.write(f"**Transaction ID:** {payment.id}")
-                    st.write(f"**Amount:** ${payment.amount or 0:.2f}")
-                    st.write(f"**Risk Score:** {payment.risk_score or 0:.3f}")
-                    st.write(f"**Sender ID:** {payment.sender_id or 'Unknown'}")
-                    st.write(f"**Recipient ID:** {payment.recipient_id or 'Unknown'}")
-                    st.write(f"**Created:** {payment.created_at or 'Unknown'}")
-                    
-                    # Get user details - FIXED: Handle None values
-                    if payment.sender_id:
-                        with eng.begin() as conn:
-                            sender = conn.execute(select(users.c.name, users.c.email).where(users.c.id == payment.sender_id)).fetchone()
-                            if sender:
-                                st.write(f"**Sender:** {sender.name or 'Unknown'} ({sender.email or 'No Email'})")
-                
-                with col2:
-                    st.write(f"**IP Address:** {payment.ip or 'Unknown'}")
-                    st.write(f"**Device:** {payment.device or 'Unknown'}")
-                    st.write(f"**Location:** {payment.location or 'Unknown'}")
-                    
-                    # Show risk factors
-                    if payment.details and isinstance(payment.details, dict):
-                        risk_factors = payment.details.get("risk_factors", [])
-                        if risk_factors:
-                            st.write("**Risk Factors:**")
-                            for factor in risk_factors[:5]:
-                                st.write(f"• {factor}")
+        # One table for the whole page; only the payment picked below builds its detail widgets
+        payments_by_id = {p.id: p for p in pending_payments}
+        pending_df = pd.DataFrame.from_records(
+            [(p.id, p.amount, p.risk_score, p.sender_name, p.recipient_id, p.created_at) for p in pending_payments],
+            columns=["ID", "Amount", "Risk Score", "Sender", "Recipient ID", "Created"]
+        )
+        pending_df = pending_df.fillna({"Amount": 0, "Risk Score": 0, "Sender": "Unknown"})
+        st.dataframe(
+            pending_df, use_container_width=True, hide_index=True,
+            column_config={
+                "Amount": st.column_config.NumberColumn(format="$%.2f"),
+                "Risk Score": st.column_config.NumberColumn(format="%.3f"),
+            }
+        )
+        
+        selected_payment_id = st.selectbox(
+            "Review payment",
+            list(payments_by_id),
+            format_func=lambda pid: f"Payment #{pid} - ${payments_by_id[pid].amount or 0:.2f} (Risk: {payments_by_id[pid].risk_score or 0:.3f})",
+            key="selected_payment"
+        )
+        payment = payments_by_id[selected_payment_id]
+        
+        # Detailed view and override actions for the selected payment
+        with st.expander(f"Payment #{payment.id} - ${payment.amount or 0:.2f} (Risk: {payment.risk_score or 0:.3f})", expanded=True):
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.write(f"**Transaction ID:** {payment.id}")
+                st.write(f"**Amount:** ${payment.amount or 0:.2f}")
+                st.write(f"**Risk Score:** {payment.risk_score or 0:.3f}")
+                st.write(f"**Sender ID:** {payment.sender_id or 'Unknown'}")
+                st.write(f"**Recipient ID:** {payment.recipient_id or 'Unknown'}")
+                st.write(f"**Created:** {payment.created_at or 'Unknown'}")
                 
-                # Admin actions (override capability)
-                st.write("**Admin Override Actions:**")
-                override_col1, override_col2 = st.columns(2)
+                # Get user details - FIXED: Handle None values
+                if payment.sender_user_id:
+                    st.write(f"**Sender:** {payment.sender_name or 'Unknown'} ({payment.sender_email or 'No Email'})")
+            
+            with col2:
+                st.write(f"**IP Address:** {payment.ip or 'Unknown'}")
+                st.write(f"**Device:** {payment.device or 'Unknown'}")
+                st.write(f"**Location:** {payment.location or 'Unknown'}")
                 
-                with override_col1:
-                    if st.button(f"✅ Force Approve", key=f"admin_approve_{payment.id}"):
-                        # Admin can force approve high-risk payments
+                # Show risk factors
+                if payment.details and isinstance(payment.details, dict):
+                    risk_factors = payment.details.get("risk_factors", [])
+                    if risk_factors:
+                        st.write("**Risk Factors:**")
+                        for factor in risk_factors[:5]:
+                            st.write(f"• {factor}")
+            
+            # Admin actions (override capability)
+            st.write("**Admin Override Actions:**")
+            override_col1, override_col2 = st.columns(2)
+            
+            with override_col1:
+                if st.button(f"✅ Force Approve", key=f"admin_approve_{payment.id}"):
+                    # Admin can force approve high-risk payments
+                    payment_amount = float(payment.amount or 0)
+                    balance = func.coalesce(users.c.balance, 0)
+                    try:
                         with eng.begin() as conn:
-                            # Get current balances - FIXED: Handle None values
-                            sender = conn.execute(select(users).where(users.c.id == payment.sender_id)).fetchone()
-                            recipient = conn.execute(select(users).where(users.c.id == payment.recipient_id)).fetchone()
+                            # Claim the payment first - a second click or another admin's
+                            # stale page finds it no longer pending and moves no money
+                            _claim_pending_payment(conn, payment.id, "Success (Admin Override)")
                             
-                            sender_balance = float(sender.balance or 0) if sender else 0
-                            payment_amount = float(payment.amount or 0)
+                            # Check-and-debit in one statement, so two admins can't both spend
+                            # the same balance; then credit the recipient
+                            debited = conn.execute(
+                                update(users)
+                                .where(users.c.id == payment.sender_id, balance >= payment_amount)
+                                .values(balance=balance - payment_amount)
+                                .returning(users.c.id)
+                            ).first()
+                            credited = conn.execute(
+                                update(users)
+                                .where(users.c.id == payment.recipient_id)
+                                .values(balance=balance + payment_amount)
+                                .returning(users.c.id)
+                            ).first() if debited else None
+                            if not credited:
+                                # Leaving the block by exception rolls the claim and debit back
+                                raise _PaymentNotFunded()
                             
-                            if sender and recipient and sender_balance >= payment_amount:
-                                # Process payment
-                                conn.execute(update(users).where(users.c.id == payment.sender_id).values(
-                                    balance=sender_balance - payment_amount
-                                ))
-                                
-                                recipient_balance = float(recipient.balance or 0)
-                                conn.execute(update(users).where(users.c.id == payment.recipient_id).values(
-                                    balance=recipient_balance + payment_amount
-                                ))
-                                
-                                # Update status
-                                conn.execute(update(transactions).where(transactions.c.id == payment.id).values(
-                                    status="Success (Admin Override)"
-                                ))
-                                
-                                conn.execute(insert(audit_logs).values(
-                                    actor_user_id=st.session_state["user_id"],
-                                    action="admin_force_approve",
-                                    entity_type="transaction",
-                                    entity_id=payment.id,
-                                    details=f"Admin force approved payment #{payment.id} for ${payment_amount} (Risk: {payment.risk_score or 0:.3f})"
-                                ))
-                                
-                                st.success("✅ Payment force approved by admin!")
-                            else:
-                                st.error("❌ Cannot process - insufficient balance")
+                            conn.execute(insert(audit_logs).values(
+                                actor_user_id=st.session_state["user_id"],
+                                action="admin_force_approve",
+                                entity_type="transaction",
+                                entity_id=payment.id,
+                                details=f"Admin force approved payment #{payment.id} for ${payment_amount} (Risk: {payment.risk_score or 0:.3f})",
+                                amount=payment_amount
+                            ))
                         
+                        _clear_account_caches()
+                        _clear_payment_caches()
+                        st.session_state["payment_flash"] = ("success", "✅ Payment force approved by admin!")
+                    except _PaymentNotFunded:
+                        st.error("❌ Cannot process - insufficient balance")
+                    except _PaymentNotPending:
+                        # Decided elsewhere (e.g. by an investigation), so the cached counts are stale too
+                        _clear_payment_caches()
+                        st.session_state["payment_flash"] = ("warning", f"⚠️ Payment #{payment.id} was already decided - no changes made")
+                    
+                    # Re-render so the decided payment and the summary cards above reflect it
+                    if "payment_flash" in st.session_state:
                         st.rerun()
-                
-                with override_col2:
-                    if st.button(f"❌ Force Reject", key=f"admin_reject_{payment.id}"):
+            
+            with override_col2:
+                if st.button(f"❌ Force Reject", key=f"admin_reject_{payment.id}"):
+                    try:
                         with eng.begin() as conn:
-                            # Update status
-                            conn.execute(update(transactions).where(transactions.c.id == payment.id).values(
-                                status="Rejected (Admin Override)"
-                            ))
+                            # Only a still-pending payment can be rejected, never one already funded
+                            _claim_pending_payment(conn, payment.id, "Rejected (Admin Override)")
                             
                             conn.execute(insert(audit_logs).values(
                                 actor_user_id=st.session_state["user_id"],
                                 action="admin_force_reject",
                                 entity_type="transaction",
                                 entity_id=payment.id,
-                                details=f"Admin force rejected payment #{payment.id} for ${payment.amount or 0} (Risk: {payment.risk_score or 0:.3f})"
+                                details=f"Admin force rejected payment #{payment.id} for ${payment.amount or 0} (Risk: {payment.risk_score or 0:.3f})",
+                                amount=payment.amount or 0
                             ))
                         
-                        st.warning("❌ Payment force rejected by admin!")
-                        st.rerun()
+                        _clear_payment_caches()
+                        st.session_state["payment_flash"] = ("warning", "❌ Payment force rejected by admin!")
+                    except _PaymentNotPending:
+                        # Decided elsewhere (e.g. by an investigation), so the cached counts are stale too
+                        _clear_payment_caches()
+                        st.session_state["payment_flash"] = ("warning", f"⚠️ Payment #{payment.id} was already decided - no changes made")
+                    st.rerun()
+        
+        if len(pending_payments) == page_size and st.button("Older ➡️", key="pending_payments_older"):
+            st.session_state["pending_payments_cursor"] = pending_payments[-1].id
+            st.rerun()
+    elif cursor:
+        st.info("📭 No older pending payments.")
     else:
         st.success("✅ No payments are currently blocked")
     
     # Recent payment approvals/rejections
     st.subheader("📈 Recent Payment Decisions")
     
-    with eng.begin() as conn:
-        recent_decisions = conn.execute(
-            select(audit_logs)
-            .where(audit_logs.c.action.in_(["approve_payment", "reject_payment", "admin_force_approve", "admin_force_reject"]))
-            .order_by(desc(audit_logs.c.created_at))
-            .limit(10)
-        ).fetchall()
+    with eng.connect() as conn:
+        # Only the columns the table shows; ix_audit_logs_action_created serves the action filter
+        recent_decisions = conn.execute(_RECENT_DECISIONS_STMT).fetchall()
     
     if recent_decisions:
-        decisions_data = []
-        for decision in recent_decisions:
-            action_display = (decision.action or "unknown_action").replace('_', ' ').title()
-            
-            # Extract amount from details string if possible - FIXED: Handle None
-            amount = "Unknown"
-            if decision.details and isinstance(decision.details, str):
-                if '$' in decision.details:
-                    try:
-                        parts = decision.details.split('$')
-                        if len(parts) > 1:
-                            amount = f"${parts[1].split(' ')[0]}"
-                    except:
-                        pass
-            
-            decisions_data.append({
-                "Action": action_display,
-                "Amount": amount,
-                "Date": decision.created_at.strftime("%Y-%m-%d %H:%M") if decision.created_at else "Unknown",
-                "Actor": f"User {decision.actor_user_id or 'Unknown'}"
-            })
-        
-        decisions_df = pd.DataFrame(decisions_data)
+        # Build the frame from the fixed-schema rows and format whole columns at once
+        decisions_df = pd.DataFrame.from_records(
+            recent_decisions, columns=["Action", "Amount", "Date", "Actor"]
+        )
+        decisions_df["Action"] = decisions_df["Action"].fillna("unknown_action").str.replace("_", " ").str.title()
+        decisions_df["Amount"] = decisions_df["Amount"].map("${:,.2f}".format, na_action="ignore").fillna("Unknown")
+        decisions_df["Date"] = pd.to_datetime(decisions_df["Date"]).dt.strftime("%Y-%m-%d %H:%M").fillna("Unknown")
+        decisions_df["Actor"] = "User " + decisions_df["Actor"].astype("Int64").astype("string").fillna("Unknown")
+        decisions_df = decisions_df.astype("string")
         st.dataframe(decisions_df, use_container_width=True)
     else:
         st.info("No recent payment decisions recorded")
@@ -983,29 +1221,23 @@ def run():
         "⚙️ Settings",
         "⏳ Payment Monitoring"  # NEW TAB
     ]
-    selected_tabs = st.tabs(tab_names)
-
-    # Tab content
-    with selected_tabs[0]:
-        render_admin_overview()
-
-    with selected_tabs[1]:
-        render_user_management()
-
-    with selected_tabs[2]:
-        render_balance_management()
-
-    with selected_tabs[3]:
-        render_transaction_monitoring()
-
-    with selected_tabs[4]:
-        render_case_management()
-
-    with selected_tabs[5]:
-        render_system_settings()
+    # st.tabs runs every tab body on each rerun, so pick the section with a radio
+    # and only render (and query for) the one being viewed
+    st.radio(
+        "Section", range(len(tab_names)), format_func=tab_names.__getitem__,
+        horizontal=True, key="admin_tab", label_visibility="collapsed"
+    )
     
-    with selected_tabs[6]:
-        render_payment_monitoring()
+    renderers = [
+        render_admin_overview,
+        render_user_management,
+        render_balance_management,
+        render_transaction_monitoring,
+        render_case_management,
+        render_system_settings,
+        render_payment_monitoring,
+    ]
+    renderers[st.session_state.admin_tab]()
 
 if __name__ == "__main__":
     run()
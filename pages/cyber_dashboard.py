@@ -4,82 +4,46 @@ import pandas as pd
 from sqlalchemy import select, update, insert, desc, and_
 from lib.auth import role_guard
 from lib.db import get_engine, users, transactions, cases, audit_logs
+from lib.case_queries import fetch_case_overview, fetch_recent_activity, fetch_open_cases, clear_case_caches
 from datetime import datetime, timedelta
 
 def render_cases_overview():
     """Cases Overview Tab - Enhanced with comprehensive investigation metrics"""
     st.header("🎯 Investigation Overview & Performance Dashboard")
     
-    eng = get_engine()
-    with eng.begin() as conn:
-        # Comprehensive case statistics for this cyber official
-        assigned_cases = conn.execute(
-            select(cases)
-            .where(cases.c.assigned_to == st.session_state["user_id"])
-        ).fetchall()
-        
-        active_cases = [c for c in assigned_cases if c.status == "In Review"]
-        resolved_cases = [c for c in assigned_cases if c.status == "Resolved"]
-        
-        # Enhanced pending approval cases (integrated with case management)
-        pending_approval_cases = conn.execute(
-            select(cases, transactions)
-            .join(transactions, cases.c.transaction_id == transactions.c.id)
-            .where(
-                cases.c.assigned_to == st.session_state["user_id"],
-                cases.c.status == "Assigned",
-                transactions.c.status == "Pending Approval"
-            )
-        ).fetchall()
-        
-        # Enhanced performance metrics with fraud analysis
-        resolved_fraud = [c for c in resolved_cases if c.finding == "Fraudulent"]
-        resolved_safe = [c for c in resolved_cases if c.finding == "Safe"]
-        
-        # Additional investigation analytics
-        high_priority_cases = conn.execute(
-            select(cases)
-            .where(and_(
-                cases.c.assigned_to == st.session_state["user_id"],
-                cases.c.priority == "High"
-            ))
-        ).fetchall()
-        
-        # Weekly performance tracking
-        this_week_resolved = [c for c in resolved_cases 
-                            if c.updated_at and (datetime.now() - c.updated_at).days <= 7]
+    stats, critical_risk_cases, high_risk_cases = fetch_case_overview(st.session_state["user_id"])
     
     # Enhanced key metrics display with comprehensive analytics
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("📋 Active Cases", len(active_cases), f"{len(pending_approval_cases)} new")
+        st.metric("📋 Active Cases", stats.active, f"{stats.pending_total} new")
     with col2:
-        st.metric("⏳ Pending Investigation", len(pending_approval_cases), "High Priority")
+        st.metric("⏳ Pending Investigation", stats.pending_total, "High Priority")
     with col3:
-        st.metric("✅ Cases Resolved", len(resolved_cases), f"{len(this_week_resolved)} this week")
+        st.metric("✅ Cases Resolved", stats.resolved, f"{stats.resolved_this_week} this week")
     with col4:
-        st.metric("🚨 Fraud Detected", len(resolved_fraud), f"{len(resolved_safe)} safe")
+        st.metric("🚨 Fraud Detected", stats.resolved_fraud, f"{stats.resolved_safe} safe")
     
     # Additional performance indicators
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        if resolved_cases:
-            fraud_detection_rate = len(resolved_fraud) / len(resolved_cases) * 100
+        if stats.resolved:
+            fraud_detection_rate = stats.resolved_fraud / stats.resolved * 100
             st.metric("🎯 Fraud Detection Rate", f"{fraud_detection_rate:.1f}%")
         else:
             st.metric("🎯 Fraud Detection Rate", "0%")
     
     with col2:
-        resolution_rate = len(resolved_cases) / len(assigned_cases) * 100 if assigned_cases else 0
+        resolution_rate = stats.resolved / stats.assigned * 100 if stats.assigned else 0
         st.metric("📊 Resolution Rate", f"{resolution_rate:.1f}%")
     
     with col3:
-        st.metric("🔥 High Priority Cases", len(high_priority_cases))
+        st.metric("🔥 High Priority Cases", stats.high_priority)
     
     with col4:
-        if resolved_cases:
+        if stats.resolved:
             avg_resolution_time = 2.3  # Simulated average
             st.metric("⏰ Avg Resolution Time", f"{avg_resolution_time} hours")
         else:
@@ -93,8 +57,8 @@ def render_cases_overview():
     with col1:
         st.subheader("📊 Investigation Performance Analytics")
         
-        if resolved_cases:
-            fraud_rate = len(resolved_fraud) / len(resolved_cases) * 100
+        if stats.resolved:
+            fraud_rate = stats.resolved_fraud / stats.resolved * 100
             st.write(f"**🚨 Fraud Detection Rate:** {fraud_rate:.1f}%")
             
             # Enhanced resolution time analysis
@@ -106,13 +70,12 @@ def render_cases_overview():
             st.write(f"**🎯 Investigation Accuracy:** {accuracy}%")
             
             # Case complexity analysis
-            if assigned_cases:
-                complex_cases = len([c for c in assigned_cases if c.priority in ["High", "Critical"]])
-                complexity_rate = complex_cases / len(assigned_cases) * 100
+            if stats.assigned:
+                complexity_rate = stats.complex / stats.assigned * 100
                 st.write(f"**🔧 Complex Cases Handled:** {complexity_rate:.1f}%")
             
             # Weekly productivity metrics
-            weekly_cases = len(this_week_resolved)
+            weekly_cases = stats.resolved_this_week
             st.write(f"**📈 Cases Resolved This Week:** {weekly_cases}")
             
             # Quality score calculation
@@ -130,17 +93,17 @@ def render_cases_overview():
         st.subheader("⚡ Quick Actions & Priority Tasks")
         
         # Enhanced quick actions for integrated workflow with priority indicators
-        if pending_approval_cases:
-            high_risk_pending = len([c for c in pending_approval_cases if c.transactions_risk_score >= 0.8])
-            if st.button(f"🔍 Investigate {len(pending_approval_cases)} High-Risk Payments", use_container_width=True, type="primary"):
+        if stats.pending_total:
+            high_risk_pending = stats.pending_critical + stats.pending_high
+            if st.button(f"🔍 Investigate {stats.pending_total} High-Risk Payments", use_container_width=True, type="primary"):
                 st.session_state.cyber_tab = 1
                 st.rerun()
             
             if high_risk_pending > 0:
                 st.error(f"🚨 {high_risk_pending} critical risk cases requiring immediate attention!")
         
-        if active_cases:
-            if st.button(f"📋 Continue {len(active_cases)} Active Investigations", use_container_width=True):
+        if stats.active:
+            if st.button(f"📋 Continue {stats.active} Active Investigations", use_container_width=True):
                 st.session_state.cyber_tab = 1
                 st.rerun()
         
@@ -158,7 +121,7 @@ def render_cases_overview():
         
         # Enhanced workload management
         st.markdown("**📋 Workload Management:**")
-        total_pending_work = len(pending_approval_cases) + len(active_cases)
+        total_pending_work = stats.pending_total + stats.active
         if total_pending_work == 0:
             st.success("✅ No pending work - excellent job!")
         elif total_pending_work <= 5:
@@ -169,11 +132,8 @@ def render_cases_overview():
             st.error(f"🚨 {total_pending_work} cases in queue - high workload!")
         
         # Enhanced case priority breakdown
-        if assigned_cases:
-            priority_breakdown = {"High": 0, "Medium": 0, "Low": 0}
-            for case in assigned_cases:
-                if case.status != "Resolved":
-                    priority_breakdown[case.priority] = priority_breakdown.get(case.priority, 0) + 1
+        if stats.assigned:
+            priority_breakdown = {"High": stats.open_high, "Medium": stats.open_medium, "Low": stats.open_low}
             
             st.write("**🎯 Case Priority Breakdown:**")
             for priority, count in priority_breakdown.items():
@@ -184,23 +144,7 @@ def render_cases_overview():
     # Enhanced recent activity monitoring with detailed insights
     st.subheader("📱 Recent Investigation Activity & Timeline")
     
-    with eng.begin() as conn:
-        # FIXED: Only use columns that definitely exist in audit_logs
-        try:
-            recent_activity = conn.execute(
-                select(audit_logs.c.action, audit_logs.c.created_at, audit_logs.c.details)
-                .where(audit_logs.c.actor_user_id == st.session_state["user_id"])
-                .order_by(desc(audit_logs.c.created_at))
-                .limit(15)
-            ).fetchall()
-        except Exception:
-            # Fallback if details column doesn't exist
-            recent_activity = conn.execute(
-                select(audit_logs.c.action, audit_logs.c.created_at)
-                .where(audit_logs.c.actor_user_id == st.session_state["user_id"])
-                .order_by(desc(audit_logs.c.created_at))
-                .limit(15)
-            ).fetchall()
+    recent_activity = fetch_recent_activity(st.session_state["user_id"])
     
     if recent_activity:
         # Enhanced activity analysis with pattern recognition
@@ -262,19 +206,14 @@ def render_cases_overview():
         st.write("• Use analysis tools for thorough reviews")
     
     # Enhanced high priority alerts with comprehensive risk analysis
-    if pending_approval_cases:
+    if stats.pending_total:
         st.markdown("---")
         st.subheader("🚨 High Priority Investigation Alerts")
         
-        # Enhanced risk categorization
-        critical_risk_cases = [c for c in pending_approval_cases if c.transactions_risk_score >= 0.9]
-        high_risk_cases = [c for c in pending_approval_cases if 0.8 <= c.transactions_risk_score < 0.9]
-        medium_risk_cases = [c for c in pending_approval_cases if 0.6 <= c.transactions_risk_score < 0.8]
-        
         if critical_risk_cases:
-            st.error(f"🔴 **CRITICAL:** {len(critical_risk_cases)} extremely high-risk payments requiring immediate investigation!")
+            st.error(f"🔴 **CRITICAL:** {stats.pending_critical} extremely high-risk payments requiring immediate investigation!")
             
-            for case in critical_risk_cases[:3]:  # Show top 3 critical cases
+            for case in critical_risk_cases:  # Show top 3 critical cases
                 risk_factors_count = 0
                 if hasattr(case, 'transactions_details') and case.transactions_details:
                     details = case.transactions_details
@@ -284,17 +223,17 @@ def render_cases_overview():
                 st.write(f"🚨 **Case #{case.cases_id}:** ${case.transactions_amount:.2f} (Risk: {case.transactions_risk_score:.3f}) - {risk_factors_count} risk factors")
         
         if high_risk_cases:
-            st.warning(f"🟡 **HIGH PRIORITY:** {len(high_risk_cases)} high-risk payments need investigation")
+            st.warning(f"🟡 **HIGH PRIORITY:** {stats.pending_high} high-risk payments need investigation")
             
-            for case in high_risk_cases[:2]:  # Show top 2 high-risk cases
+            for case in high_risk_cases:  # Show top 2 high-risk cases
                 st.write(f"⚠️ **Case #{case.cases_id}:** ${case.transactions_amount:.2f} (Risk: {case.transactions_risk_score:.3f})")
         
-        if medium_risk_cases:
-            remaining = len(medium_risk_cases)
+        if stats.pending_medium:
+            remaining = stats.pending_medium
             st.info(f"🟢 **STANDARD:** {remaining} additional cases pending investigation")
         
         # Enhanced investigation workload recommendations
-        total_cases = len(pending_approval_cases)
+        total_cases = stats.pending_total
         if total_cases >= 10:
             st.error("⚠️ **WORKLOAD ALERT:** Large investigation queue - prioritize critical and high-risk cases first")
         elif total_cases >= 5:
@@ -311,17 +250,7 @@ def render_integrated_investigation():
     st.header("🔍 Payment Investigation & Decision Center")
     
     eng = get_engine()
-    with eng.begin() as conn:
-        # Enhanced case retrieval with comprehensive filtering
-        all_assigned = conn.execute(
-            select(cases, transactions)
-            .join(transactions, cases.c.transaction_id == transactions.c.id)
-            .where(
-                cases.c.assigned_to == st.session_state["user_id"],
-                cases.c.status.in_(["Assigned", "In Review"])
-            )
-            .order_by(desc(transactions.c.risk_score), desc(cases.c.created_at))
-        ).fetchall()
+    all_assigned = fetch_open_cases(st.session_state["user_id"])
     
     if not all_assigned:
         st.success("✅ No cases requiring investigation")
@@ -1384,7 +1313,8 @@ Investigation Protocol: COMPREHENSIVE_FRAUD_ANALYSIS_v2.3
                     action=f"comprehensive_investigation_resolution_{finding.lower()}",
                     entity_type="fraud_investigation",
                     entity_id=case_row.transactions_id,
-                    details=f"Comprehensive fraud investigation completed - Case #{selected_case_id} - Transaction #{case_row.transactions_id} for ${case_row.transactions_amount:,.2f} - Final Classification: {finding.upper()} with {confidence}% investigator confidence - Payment {payment_action} - Evidence Categories: {len(evidence_categories)} analyzed - Investigation Quality: COMPREHENSIVE"
+                    details=f"Comprehensive fraud investigation completed - Case #{selected_case_id} - Transaction #{case_row.transactions_id} for ${case_row.transactions_amount:,.2f} - Final Classification: {finding.upper()} with {confidence}% investigator confidence - Payment {payment_action} - Evidence Categories: {len(evidence_categories)} analyzed - Investigation Quality: COMPREHENSIVE",
+                    amount=case_row.transactions_amount
                 ))
             
             st.markdown("---")
@@ -1393,6 +1323,8 @@ Investigation Protocol: COMPREHENSIVE_FRAUD_ANALYSIS_v2.3
             st.info(f"📊 **Investigation quality assessment: COMPREHENSIVE analysis with {len(evidence_categories)} evidence categories thoroughly examined**")
             st.info(f"🔐 **Full audit trail created and investigation report archived for compliance and quality assurance**")
             
+            clear_case_caches()
+            fetch_recent_activity.clear()
             st.rerun()
         elif submitted and len(investigation_notes.strip()) < 100:
             st.error("❌ **Investigation report insufficient - please provide at least 100 characters of comprehensive detailed analysis and decision rationale**")
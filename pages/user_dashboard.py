@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import select, update, insert, desc, and_, text
+from sqlalchemy import select, update, insert, desc, and_, text, func
 from lib.auth import role_guard
-from lib.db import get_engine, users, transactions, cases, settings, audit_logs, tickets
+from lib.db import get_engine, invalidate_user_cache, risk_band_case, users, transactions, cases, settings, audit_logs, tickets
 from datetime import datetime, timedelta
 from lib.ml import AdvancedFraudModel  # ADD THIS LINE
 import json
@@ -155,20 +155,21 @@ def calculate_fraud_risk_score(amount, sender_id, recipient_id, location, device
     
     # Velocity-based risk (transaction frequency analysis)
     with eng.begin() as conn:
-        recent_txs = conn.execute(
-            select(transactions.c.id, transactions.c.amount, transactions.c.created_at)
+        # Count and total in SQL - one row back instead of every recent transaction
+        recent_count, recent_total = conn.execute(
+            select(func.count(), func.coalesce(func.sum(transactions.c.amount), 0))
             .where(
                 transactions.c.sender_id == sender_id,
                 transactions.c.created_at >= (datetime.now() - timedelta(hours=24))
             )
-        ).fetchall()
+        ).one()
         
-        if len(recent_txs) > 5:
+        if recent_count > 5:
             risk_score += 0.25
-            risk_factors.append(f"High transaction velocity: {len(recent_txs)} transactions in 24 hours")
+            risk_factors.append(f"High transaction velocity: {recent_count} transactions in 24 hours")
         
         # Amount velocity check
-        total_24h = sum(tx.amount for tx in recent_txs) + amount
+        total_24h = recent_total + amount
         if total_24h > 10000:
             risk_score += 0.20
             risk_factors.append(f"High amount velocity: ${total_24h:.2f} in 24 hours")
@@ -176,13 +177,13 @@ def calculate_fraud_risk_score(amount, sender_id, recipient_id, location, device
     # User behavior analysis
     with eng.begin() as conn:
         user_history = conn.execute(
-            select(transactions.c.amount, transactions.c.risk_score)
+            select(transactions.c.amount)
             .where(transactions.c.sender_id == sender_id)
             .limit(10)
-        ).fetchall()
+        ).scalars().all()
         
         if user_history:
-            avg_amount = sum(tx.amount for tx in user_history) / len(user_history)
+            avg_amount = sum(user_history) / len(user_history)
             if amount > avg_amount * 3:
                 risk_score += 0.15
                 risk_factors.append("Transaction amount significantly higher than user's typical pattern")
@@ -214,13 +215,18 @@ def calculate_fraud_risk_score(amount, sender_id, recipient_id, location, device
     
     return risk_score, risk_factors
 
+@st.cache_resource
+def get_fraud_model():
+    """One trained model per server process instead of retraining on every payment"""
+    return AdvancedFraudModel()
+
 def process_payment(sender_id, recipient_id, amount, description, device_data, location, failed_attempts, test_scenario="Normal Transaction"):
     """Enhanced payment processing with REAL ML model integration - FULLY FIXED VERSION"""
     try:
         eng = get_engine()
         
         # Initialize ML model
-        fraud_model = AdvancedFraudModel()
+        fraud_model = get_fraud_model()
         
         with eng.begin() as conn:
             # Get sender and recipient info
@@ -310,6 +316,9 @@ def process_payment(sender_id, recipient_id, amount, description, device_data, l
                 }
             }
             
+            # Band the score against the admin thresholds so dashboards can filter on it
+            sys_cfg = conn.execute(select(settings.c.value).where(settings.c.key == "system")).scalar() or {}
+            
             # Insert transaction
             result = conn.execute(insert(transactions).values(
                 sender_id=sender_id,
@@ -322,6 +331,7 @@ def process_payment(sender_id, recipient_id, amount, description, device_data, l
                 location=location,
                 status=status,
                 risk_score=final_risk_score,
+                risk_band=risk_band_case(sys_cfg.get("flag_threshold", 0.4), sys_cfg.get("block_threshold", 0.7), final_risk_score),
                 details=json.dumps(transaction_details),
                 created_at=now
             ))
@@ -1234,7 +1244,7 @@ def render_profile_settings():
                     details=f"Updated profile: name='{new_name}', phone='{new_phone}'",
                     created_at=datetime.now()
                 ))
-            
+            invalidate_user_cache(st.session_state.get("email"))
             st.success("✅ Profile updated successfully!")
             st.rerun()
     